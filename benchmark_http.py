@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Measure concurrent request throughput and latency of running app endpoints.
+
+Start the app (python main.py) and point the benchmark at the hot routes:
+
+Usage:
+    python benchmark_http.py http://localhost:8000/ http://localhost:8000/paragony/ --concurrency 50 --requests 2000
+"""
+from statistics import mean, quantiles
+import argparse
+import asyncio
+import time
+import httpx
+
+async def run(url: str, concurrency: int, requests: int):
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP concurrency benchmark")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'url':40} {'req/s':>8} {'mean ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for url in args.urls:
+        latencies, errors, elapsed = asyncio.run(run(url, args.concurrency, args.requests))
+        p95 = quantiles(latencies, n=20)[-1] if len(latencies) > 1 else float("nan")
+        print(f"{url[-40:]:40} {len(latencies) / elapsed:8.0f} {mean(latencies) if latencies else 0:8.1f} {p95:8.1f} {errors:7}")
+
+if __name__ == "__main__":
+    main()
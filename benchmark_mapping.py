@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Compare per-item and batch mapping suggestions for receipt products.
+
+Each run uses a fresh temporary database filled with a synthetic pantry and a
+set of receipts. The per-item path scores every receipt line separately and
+flushes it through the ORM; the batch path scores a whole receipt as one
+matrix (ProductMapper.process_receipt_products) and writes it with a single
+bulk UPDATE.
+
+Usage:
+    python benchmark_mapping.py --pantry 20000 --receipts 50 --lines 30
+"""
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+import argparse
+import tempfile
+import random
+import json
+import time
+import os
+
+BRANDS = ["Łaciate", "Mlekovita", "Pilos", "Sokołów", "Tymbark", "Wedel", "Lubella", "Krakus"]
+NAMES = [
+    "Mleko UHT 3,2% 1L", "Ser żółty gouda", "Chleb żytni", "Masło extra 82%", "Jogurt naturalny",
+    "Pomidory malinowe", "Kawa mielona", "Herbata czarna", "Makaron spaghetti", "Ryż basmati",
+    "Jabłka ligol", "Woda mineralna 1,5L", "Sok pomarańczowy", "Czekolada gorzka", "Szynka konserwowa"
+]
+
+def _receipt_name(rng: random.Random) -> str:
+    # Receipt lines are upper-case, often truncated and without diacritics
+    name = f"{rng.choice(NAMES)} {rng.choice(BRANDS)}".upper()
+    return name.translate(str.maketrans("ĄĆĘŁŃÓŚŹŻ", "ACELNOSZZ"))[:rng.randint(12, 28)]
+
+def _populate(pantry: int, receipts: int, lines: int, seed: int):
+    from database import engine, SessionLocal
+    from models import Paragon, Produkt, KategoriaProduktu, StatusMapowania, StatusParagonu
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    product = {
+        "kategoria": KategoriaProduktu.SPOZYWCZE,
+        "cena": Decimal("1.00"),
+        "data_dodania": now,
+        "data_aktualizacji": now,
+        "status_mapowania": StatusMapowania.OCZEKUJE
+    }
+    with engine.begin() as connection:
+        connection.execute(Produkt.__table__.insert(), [
+            {**product, "nazwa": f"{rng.choice(NAMES)} {rng.choice(BRANDS)} {i}"} for i in range(pantry)
+        ])
+
+    paragon_ids = []
+    with SessionLocal() as db:
+        for i in range(receipts):
+            paragon = Paragon(
+                nazwa_pliku_oryginalnego=f"paragon_{i}.jpg",
+                sciezka_pliku_na_serwerze=f"/tmp/paragon_{i}.jpg",
+                mime_type_pliku="image/jpeg",
+                status_przetwarzania=StatusParagonu.PRZETWORZONY_OK
+            )
+            db.add(paragon)
+            db.flush()
+            paragon_ids.append(paragon.id)
+        db.commit()
+    with engine.begin() as connection:
+        connection.execute(Produkt.__table__.insert(), [
+            {**product, "nazwa": _receipt_name(rng), "paragon_id": paragon_id}
+            for paragon_id in paragon_ids for _ in range(lines)
+        ])
+    return paragon_ids
+
+def _per_item(mapper, products):
+    for product in products:
+        product.sugestie_mapowania = json.dumps(mapper.find_suggestions(product.nazwa))
+        mapper.session.add(product)
+    mapper.session.commit()
+
+def run(pantry: int, receipts: int, lines: int, seed: int):
+    from sqlmodel import select
+    from database import SessionLocal
+    from models import Produkt
+    from product_mapper import ProductMapper
+    from product_index import get_pantry_index
+    from db_logger import db_log_sink
+
+    paragon_ids = _populate(pantry, receipts, lines, seed)
+    started = time.perf_counter()
+    get_pantry_index().search("")
+    print(f"pantry index built in {(time.perf_counter() - started) * 1000:.0f} ms ({pantry} products)")
+
+    print(f"{'path':10} {'receipts/s':>11} {'ms/receipt':>11} {'lines/s':>9}")
+    results = {}
+    for path in ("per-item", "batch"):
+        elapsed = 0.0
+        suggestions = {}
+        for paragon_id in paragon_ids:
+            with SessionLocal() as db:
+                products = db.exec(select(Produkt).where(Produkt.paragon_id == paragon_id).order_by(Produkt.id)).all()
+                mapper = ProductMapper(db)
+                started = time.perf_counter()
+                if path == "batch":
+                    mapper.process_receipt_products(products)
+                else:
+                    _per_item(mapper, products)
+                elapsed += time.perf_counter() - started
+                suggestions.update({product.id: product.sugestie_mapowania for product in products})
+        results[path] = suggestions
+        print(f"{path:10} {receipts / elapsed:11.1f} {elapsed * 1000 / receipts:11.2f} {receipts * lines / elapsed:9.0f}")
+    db_log_sink.flush()
+
+    differing = sum(
+        {s["id"] for s in json.loads(results["per-item"][product_id])} != {s["id"] for s in json.loads(suggestion)}
+        for product_id, suggestion in results["batch"].items()
+    )
+    print(f"lines with different suggestion sets: {differing} of {len(results['batch'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Product mapping benchmark")
+    parser.add_argument("--pantry", type=int, default=20000)
+    parser.add_argument("--receipts", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        from schema import migrate
+        migrate()
+        run(args.pantry, args.receipts, args.lines, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Compare OCR speed and accuracy with and without image preprocessing.
+
+Fixture directory layout: every receipt image (jpg/png) has a ground truth
+text file with the same stem, e.g. biedronka_01.jpg + biedronka_01.txt.
+
+Usage:
+    python benchmark_ocr.py fixtures/receipts --steps grayscale,crop,resize,deskew,binarize
+"""
+from pathlib import Path
+from difflib import SequenceMatcher
+from statistics import mean
+from PIL import Image
+from image_preprocessing import preprocess_for_ocr, parse_steps
+import pytesseract
+import argparse
+import time
+import sys
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+def accuracy(expected: str, actual: str) -> float:
+    """Character-level similarity of whitespace-normalized texts"""
+    return SequenceMatcher(None, " ".join(expected.split()), " ".join(actual.split())).ratio()
+
+def run_ocr(image_path: Path, steps, target_width: int, max_skew: float):
+    started = time.perf_counter()
+    with Image.open(image_path) as image:
+        image, timings = preprocess_for_ocr(image, steps, target_width, max_skew)
+        preprocessed = time.perf_counter()
+        text = pytesseract.image_to_string(image, lang="pol")
+    finished = time.perf_counter()
+    return text, (preprocessed - started) * 1000, (finished - preprocessed) * 1000, timings
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR preprocessing benchmark")
+    parser.add_argument("fixtures", type=Path, help="Directory with receipt images and .txt ground truth")
+    parser.add_argument("--steps", default="grayscale,crop,resize,deskew,binarize")
+    parser.add_argument("--target-width", type=int, default=1200)
+    parser.add_argument("--max-skew", type=float, default=15.0)
+    args = parser.parse_args()
+
+    images = sorted(p for p in args.fixtures.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES and p.with_suffix(".txt").exists())
+    if not images:
+        print(f"No fixtures with ground truth found in {args.fixtures}")
+        sys.exit(1)
+
+    steps = parse_steps(args.steps)
+    rows = []
+    print(f"{'fixture':30} {'raw ms':>9} {'raw acc':>8} {'prep ms':>9} {'ocr ms':>9} {'prep acc':>8}")
+    for image_path in images:
+        expected = image_path.with_suffix(".txt").read_text(encoding="utf-8")
+        raw_text, _, raw_ms, _ = run_ocr(image_path, (), args.target_width, args.max_skew)
+        prep_text, prep_ms, ocr_ms, _ = run_ocr(image_path, steps, args.target_width, args.max_skew)
+        row = (raw_ms, accuracy(expected, raw_text), prep_ms, ocr_ms, accuracy(expected, prep_text))
+        rows.append(row)
+        print(f"{image_path.name[:30]:30} {row[0]:9.0f} {row[1]:8.3f} {row[2]:9.0f} {row[3]:9.0f} {row[4]:8.3f}")
+
+    raw_ms, raw_acc, prep_ms, ocr_ms, prep_acc = (mean(column) for column in zip(*rows))
+    print(f"{'mean':30} {raw_ms:9.0f} {raw_acc:8.3f} {prep_ms:9.0f} {ocr_ms:9.0f} {prep_acc:8.3f}")
+    print(f"Speedup: {raw_ms / (prep_ms + ocr_ms):.2f}x, accuracy change: {prep_acc - raw_acc:+.3f}")
+
+if __name__ == "__main__":
+    main()
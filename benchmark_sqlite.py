@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compare concurrent SQLite read/write throughput with and without the WAL profile.
+
+Each run uses a fresh temporary database with the application schema. Writer
+processes insert LogBledow rows in small transactions (like the log sink) while
+reader processes page through the log list, mimicking the web app, the Celery
+workers and the log writer sharing spizarnia.db.
+
+Usage:
+    python benchmark_sqlite.py --writers 4 --readers 4 --seconds 10
+"""
+from multiprocessing import Process, Queue
+from pathlib import Path
+import argparse
+import tempfile
+import time
+import os
+
+def _worker(role: str, database_url: str, profile: str, seconds: float, results: Queue):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_PROFILE"] = profile
+    from datetime import datetime
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+    from database import engine
+    from models import LogBledow
+
+    done = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            with engine.begin() as connection:
+                if role == "writer":
+                    connection.execute(LogBledow.__table__.insert(), [{
+                        "timestamp": datetime.now(),
+                        "poziom": "INFO",
+                        "modul_aplikacji": "benchmark",
+                        "funkcja": "writer",
+                        "komunikat_bledu": f"Wpis testowy {done}",
+                        "szczegoly_techniczne": None
+                    } for _ in range(20)])
+                else:
+                    connection.execute(
+                        select(LogBledow.id, LogBledow.komunikat_bledu)
+                        .order_by(LogBledow.timestamp.desc(), LogBledow.id.desc())
+                        .limit(30)
+                    ).all()
+            done += 1
+        except OperationalError:
+            locked += 1
+    results.put((role, done, locked))
+
+def _setup(database_url: str, profile: str):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_PROFILE"] = profile
+    from schema import migrate
+    migrate()
+
+def run(profile: str, writers: int, readers: int, seconds: float):
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        os.environ["DATABASE_URL"] = database_url
+        os.environ["SQLITE_PROFILE"] = profile
+        # Build the schema in a child so this process never imports database.py
+        setup = Process(target=_setup, args=(database_url, profile))
+        setup.start()
+        setup.join()
+
+        results: Queue = Queue()
+        processes = [
+            Process(target=_worker, args=(role, database_url, profile, seconds, results))
+            for role in ["writer"] * writers + ["reader"] * readers
+        ]
+        for process in processes:
+            process.start()
+        totals = {"writer": [0, 0], "reader": [0, 0]}
+        for _ in processes:
+            role, done, locked = results.get()
+            totals[role][0] += done
+            totals[role][1] += locked
+        for process in processes:
+            process.join()
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'profile':10} {'writes/s':>10} {'locked':>8} {'reads/s':>10} {'locked':>8}")
+    for profile in ("legacy", "wal"):
+        totals = run(profile, args.writers, args.readers, args.seconds)
+        writes, write_locked = totals["writer"]
+        reads, read_locked = totals["reader"]
+        print(f"{profile:10} {writes / args.seconds:10.0f} {write_locked:8} {reads / args.seconds:10.0f} {read_locked:8}")
+
+if __name__ == "__main__":
+    main()
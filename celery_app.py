@@ -41,6 +41,7 @@ celery_app.conf.update(
 # Import tasks module to register tasks
 celery_app.autodiscover_tasks(['tasks'], force=True)
 
-# Import and register the process_receipt task
-from tasks import process_receipt_task
-celery_app.tasks.register(process_receipt_task) 
\ No newline at end of file
+# Import and register the receipt pipeline tasks
+from tasks import process_receipt_task, map_receipt_products_task
+celery_app.tasks.register(process_receipt_task)
+celery_app.tasks.register(map_receipt_products_task)
\ No newline at end of file
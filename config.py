@@ -34,17 +34,91 @@ class Settings(BaseSettings):
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
     DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
     DB_POOL_RECYCLE: float = float(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  # Server databases only
+    # Read replicas (comma-separated URLs) for list/report queries; pool settings default to the DB_POOL_* ones
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    DB_REPLICA_POOL_SIZE: int = int(os.getenv("DB_REPLICA_POOL_SIZE", os.getenv("DB_POOL_SIZE", "5")))
+    DB_REPLICA_MAX_OVERFLOW: int = int(os.getenv("DB_REPLICA_MAX_OVERFLOW", os.getenv("DB_MAX_OVERFLOW", "10")))
+    DB_REPLICA_POOL_TIMEOUT: float = float(os.getenv("DB_REPLICA_POOL_TIMEOUT", os.getenv("DB_POOL_TIMEOUT", "30")))
+    DB_REPLICA_POOL_RECYCLE: float = float(os.getenv("DB_REPLICA_POOL_RECYCLE", os.getenv("DB_POOL_RECYCLE", "1800")))
     SQL_ECHO: bool = os.getenv("SQL_ECHO", "false").lower() == "true"
+    # SQLite profile, read by database.py at import time; SQLITE_PROFILE=legacy disables it
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "wal")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MAINTENANCE_INTERVAL_MINUTES: float = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL_MINUTES", "60"))
+    # Database log sink, read by db_logger at import time
+    DB_LOG_QUEUE_SIZE: int = int(os.getenv("DB_LOG_QUEUE_SIZE", "10000"))
+    DB_LOG_BATCH_SIZE: int = int(os.getenv("DB_LOG_BATCH_SIZE", "200"))
+    DB_LOG_FLUSH_INTERVAL_MS: int = int(os.getenv("DB_LOG_FLUSH_INTERVAL_MS", "500"))
+    DB_LOG_OVERFLOW_POLICY: str = os.getenv("DB_LOG_OVERFLOW_POLICY", "drop_oldest")
+    DB_LOG_BLOCK_TIMEOUT_MS: int = int(os.getenv("DB_LOG_BLOCK_TIMEOUT_MS", "50"))
+    DB_LOG_WRITE_ATTEMPTS: int = int(os.getenv("DB_LOG_WRITE_ATTEMPTS", "3"))
+    # INFO sampling per "modul:funkcja" or "modul" as JSON, e.g. {"routes.logi:get_logs": 0.05, "*": 1.0}
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", (
+        '{"routes.logi:get_logs": 0.1, "routes.logi:get_log": 0.1, '
+        '"routes.statystyki:get_statistics": 0.1, "routes.statystyki:get_category_statistics": 0.1}'
+    ))
+    LOG_SAMPLED_LEVELS: str = os.getenv("LOG_SAMPLED_LEVELS", "INFO")
+    LOG_RATE_LIMIT_PER_SECOND: float = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "0"))  # Per modul:funkcja, 0 disables
+    LOG_RATE_LIMIT_BURST: int = int(os.getenv("LOG_RATE_LIMIT_BURST", "50"))
+    LOG_SAMPLING_SUMMARY_INTERVAL_S: int = int(os.getenv("LOG_SAMPLING_SUMMARY_INTERVAL_S", "60"))
+    # Log archival (/logi/clear and the retention task)
+    LOG_ARCHIVE_DIR: str = os.getenv("LOG_ARCHIVE_DIR", "logs")
+    LOG_ARCHIVE_CHUNK_SIZE: int = int(os.getenv("LOG_ARCHIVE_CHUNK_SIZE", "5000"))
+    LOG_ARCHIVE_COMPRESSION: str = os.getenv("LOG_ARCHIVE_COMPRESSION", "gzip")  # gzip or zstd
+    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", "0"))  # 0 disables the scheduled retention task
+    LOG_RETENTION_INTERVAL_HOURS: float = float(os.getenv("LOG_RETENTION_INTERVAL_HOURS", "24"))
     
     # File Upload
     UPLOAD_FOLDER: str = "uploads"
     MAX_CONTENT_LENGTH: int = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS: List[str] = ["jpg", "jpeg", "png", "gif", "pdf"]
+    PDF_DPI: int = int(os.getenv("PDF_DPI", "300"))
+    PDF_TEXT_LAYER_MIN_CHARS: int = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "50"))  # Below this the PDF is OCR'd
+    
+    # OCR
+    OCR_BACKEND: str = os.getenv("OCR_BACKEND", "auto")  # auto, tesserocr or pytesseract
+    OCR_LANG: str = os.getenv("OCR_LANG", "pol")
+    OCR_ENGINE_POOL_SIZE: int = int(os.getenv("OCR_ENGINE_POOL_SIZE", "2"))  # Warm tesserocr engines per process
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))  # Concurrent PDF pages
+    OCR_PREPROCESSING: str = os.getenv("OCR_PREPROCESSING", "grayscale,crop,resize,deskew,binarize")  # Empty disables
+    OCR_TARGET_WIDTH: int = int(os.getenv("OCR_TARGET_WIDTH", "1200"))  # ~300 DPI for an 80mm receipt
+    OCR_MAX_SKEW: float = float(os.getenv("OCR_MAX_SKEW", "15"))
     
     # Ollama
     OLLAMA_API_URL: str = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "bielik:latest")
     OLLAMA_TIMEOUT: int = int(os.getenv("OLLAMA_TIMEOUT", "600"))  # 10 minutes
+    OLLAMA_MAX_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+    OLLAMA_MAX_KEEPALIVE: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "5"))
+    OLLAMA_KEEPALIVE_EXPIRY: float = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "300"))
+    OLLAMA_HTTP2: bool = os.getenv("OLLAMA_HTTP2", "false").lower() == "true"  # Requires the h2 package
+    OLLAMA_STREAMING: bool = os.getenv("OLLAMA_STREAMING", "true").lower() == "true"
+    
+    # Duplicate detection: identical files (SHA-256) are discarded, uploads within
+    # DUPLICATE_MAX_DISTANCE bits of perceptual hash (out of 64) only get a warning
+    DUPLICATE_DETECTION_ENABLED: bool = os.getenv("DUPLICATE_DETECTION_ENABLED", "true").lower() == "true"
+    DUPLICATE_MAX_DISTANCE: int = int(os.getenv("DUPLICATE_MAX_DISTANCE", "4"))
+
+    # Product mapping
+    PANTRY_INDEX_MAX_AGE_S: float = float(os.getenv("PANTRY_INDEX_MAX_AGE_S", "300"))  # Full rebuild picks up other processes' edits
+    PRODUCT_ALIAS_AUTO_MAP_CONFIRMATIONS: int = int(os.getenv("PRODUCT_ALIAS_AUTO_MAP_CONFIRMATIONS", "2"))  # 0 only suggests aliases
+    PRODUCT_EMBEDDINGS_ENABLED: bool = os.getenv("PRODUCT_EMBEDDINGS_ENABLED", "false").lower() == "true"
+    PRODUCT_EMBEDDINGS_MODEL: str = os.getenv("PRODUCT_EMBEDDINGS_MODEL", "nomic-embed-text")  # Ollama embedding model
+    PRODUCT_EMBEDDINGS_DIR: str = os.getenv("PRODUCT_EMBEDDINGS_DIR", "cache/embeddings")
+    PRODUCT_EMBEDDINGS_WEIGHT: float = float(os.getenv("PRODUCT_EMBEDDINGS_WEIGHT", "0.5"))  # Share of cosine similarity in the score
+    PRODUCT_EMBEDDINGS_TIMEOUT: float = float(os.getenv("PRODUCT_EMBEDDINGS_TIMEOUT", "30"))
+    
+    # Result cache (OCR text and LLM extraction)
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_DIR: str = os.getenv("RESULT_CACHE_DIR", "cache")
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 256MB
+    RESULT_CACHE_MEMORY_ITEMS: int = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "256"))
     
     # Celery
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
@@ -3,41 +3,123 @@ from sqlmodel import SQLModel, Session, create_engine
 from sqlalchemy.engine import Engine
 from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.pool import QueuePool
-from typing import Generator
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, AsyncGenerator, Dict, Generator
 from contextlib import contextmanager
+import itertools
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 # Get database URL from environment variable or use default SQLite
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./spizarnia.db")
 
-# Create engine with connection pooling
-engine = create_engine(
-    DATABASE_URL,
-    echo=os.getenv("SQL_ECHO", "false").lower() == "true",
-    poolclass=QueuePool,
-    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
-    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
-    pool_recycle=float(os.getenv("DB_POOL_RECYCLE", "1800")),
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# SQLite performance profile applied to every new connection; SQLITE_PROFILE=legacy keeps driver defaults
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # Negative: KiB, i.e. 64 MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Pool wait metrics per engine role, reported by get_pool_stats()
+POOL_METRICS: Dict[str, Dict[str, float]] = {}
+
+def _timed_pool_class(base, role: str):
+    """Pool subclass recording how long checkouts wait; a class per role survives engine.dispose()"""
+    metrics = POOL_METRICS.setdefault(role, {"checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "timeouts": 0})
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except PoolTimeoutError:
+            metrics["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            metrics["checkouts"] += 1
+            metrics["wait_ms_total"] += waited
+            metrics["wait_ms_max"] = max(metrics["wait_ms_max"], waited)
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+def _engine_options(url: str, role: str, pool_base) -> Dict[str, Any]:
+    """Pool sizing per role: DB_POOL_* for the primary, DB_REPLICA_POOL_* (defaulting to them) for replicas"""
+    prefix = "DB_REPLICA_" if role.startswith("replica") else "DB_"
+    def setting(name: str, default: str) -> str:
+        return os.getenv(f"{prefix}{name}", os.getenv(f"DB_{name}", default))
+
+    options = {
+        "echo": os.getenv("SQL_ECHO", "false").lower() == "true",
+        "poolclass": _timed_pool_class(pool_base, role),
+        "pool_size": int(setting("POOL_SIZE", "5")),
+        "max_overflow": int(setting("MAX_OVERFLOW", "10")),
+        "pool_timeout": float(setting("POOL_TIMEOUT", "30")),
+        "pool_recycle": float(setting("POOL_RECYCLE", "1800")),
+    }
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}
+        if pool_base is QueuePool:
+            options["connect_args"]["check_same_thread"] = False
+    else:
+        # Server connections can be dropped by failovers and idle timeouts
+        options["pool_pre_ping"] = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    return options
+
+def _async_url(url: str) -> str:
+    """Same database through an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL"""
+    for sync_prefix, async_prefix in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://")
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+# Read replicas for list and report queries, e.g. postgresql://ro@replica1/spizarnia,postgresql://ro@replica2/spizarnia
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Primary: all writes, Celery tasks and migrations
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, "primary", QueuePool))
+
+# Async engine for FastAPI routes; SQLite pragmas are applied by the Engine "connect" listener below
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, "primary_async", AsyncAdaptedQueuePool)
 )
 
+replica_engines = [
+    create_engine(url, **_engine_options(url, f"replica{i}", QueuePool))
+    for i, url in enumerate(DATABASE_REPLICA_URLS)
+] or [engine]
+async_replica_engines = [
+    create_async_engine(_async_url(url), **_engine_options(url, f"replica{i}_async", AsyncAdaptedQueuePool))
+    for i, url in enumerate(DATABASE_REPLICA_URLS)
+] or [async_engine]
+_replica_cycle = itertools.cycle(replica_engines)
+_async_replica_cycle = itertools.cycle(async_replica_engines)
+
+# expire_on_commit=False: attributes must stay readable without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 # Create all tables
 def create_db_and_tables():
-    """Create database tables in the correct order"""
+    """Make sure the database schema is current, migrating through Alembic once per process"""
     try:
-        # First create the LogBledow table since it's needed for logging
-        from models import LogBledow
-        SQLModel.metadata.create_all(engine, tables=[LogBledow.__table__])
-        
-        # Then create all other tables
-        SQLModel.metadata.create_all(engine)
-        logger.info("Database tables created successfully")
+        from schema import ensure_schema
+        ensure_schema()
     except SQLAlchemyError as e:
-        logger.error(f"Error creating database tables: {str(e)}", exc_info=True)
+        logger.error(f"Error preparing database schema: {str(e)}", exc_info=True)
         raise
 
 @contextmanager
@@ -61,10 +143,75 @@ def SessionLocal() -> Session:
     """Create a new database session"""
     return Session(engine)
 
+def ReadSessionLocal() -> Session:
+    """Session on the next read replica (the primary when none are configured); never write through it"""
+    return Session(next(_replica_cycle))
+
+@contextmanager
+def get_read_session() -> Generator[Session, None, None]:
+    """Context manager for read-only list and report queries, routed to a replica"""
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+async def get_async_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """FastAPI dependency with an AsyncSession on a read replica, for list and report routes"""
+    async with AsyncSession(next(_async_replica_cycle), expire_on_commit=False) as session:
+        yield session
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool occupancy and checkout wait times per engine role"""
+    engines = {"primary": engine, "primary_async": async_engine.sync_engine}
+    if DATABASE_REPLICA_URLS:
+        engines.update({f"replica{i}": e for i, e in enumerate(replica_engines)})
+        engines.update({f"replica{i}_async": e.sync_engine for i, e in enumerate(async_replica_engines)})
+    stats = {}
+    for role, role_engine in engines.items():
+        metrics = POOL_METRICS.get(role, {})
+        checkouts = metrics.get("checkouts", 0)
+        stats[role] = {
+            "status": role_engine.pool.status(),
+            "checkouts": checkouts,
+            "wait_ms_avg": round(metrics["wait_ms_total"] / checkouts, 3) if checkouts else 0.0,
+            "wait_ms_max": round(metrics.get("wait_ms_max", 0.0), 3),
+            "timeouts": metrics.get("timeouts", 0)
+        }
+    return stats
+
+async def dispose_async_engines() -> None:
+    """Close pooled async connections, on application shutdown"""
+    for async_engine_ in {async_engine, *async_replica_engines}:
+        await async_engine_.dispose()
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """FastAPI dependency with an AsyncSession that does not block the event loop"""
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Database session error: {str(e)}", exc_info=True)
+            raise
+
 # Add event listeners for better debugging
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     if DATABASE_URL.startswith("sqlite"):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close() 
\ No newline at end of file
+        if SQLITE_PROFILE != "legacy":
+            # journal_mode is persistent in the file, the rest are per connection
+            for pragma, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+def sqlite_maintenance() -> dict:
+    """Checkpoint and truncate the WAL and refresh planner statistics"""
+    if not DATABASE_URL.startswith("sqlite"):
+        return {}
+    with engine.connect() as connection:
+        busy, wal_pages, checkpointed = connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+        connection.exec_driver_sql("PRAGMA optimize")
+    return {"busy": busy, "wal_pages": wal_pages, "checkpointed": checkpointed}
@@ -1,18 +1,339 @@
 from models import LogBledow, PoziomLogu
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import logging
+import atexit
+import random
+import queue
+import json
+import time
+import os
 import pytz
 
+logger = logging.getLogger(__name__)
+# Rows the database rejected end up in the file log (app.log) through the root handlers
+fallback_logger = logging.getLogger(f"{__name__}.fallback")
+
+# Read from the environment like database.py: config.py logs through this module while
+# Settings is still being constructed
+DB_LOG_QUEUE_SIZE = int(os.getenv("DB_LOG_QUEUE_SIZE", "10000"))
+DB_LOG_BATCH_SIZE = int(os.getenv("DB_LOG_BATCH_SIZE", "200"))
+DB_LOG_FLUSH_INTERVAL_MS = int(os.getenv("DB_LOG_FLUSH_INTERVAL_MS", "500"))
+DB_LOG_OVERFLOW_POLICY = os.getenv("DB_LOG_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest, drop_newest or block
+DB_LOG_BLOCK_TIMEOUT_MS = int(os.getenv("DB_LOG_BLOCK_TIMEOUT_MS", "50"))
+DB_LOG_WRITE_ATTEMPTS = int(os.getenv("DB_LOG_WRITE_ATTEMPTS", "3"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", (
+    '{"routes.logi:get_logs": 0.1, "routes.logi:get_log": 0.1, '
+    '"routes.statystyki:get_statistics": 0.1, "routes.statystyki:get_category_statistics": 0.1}'
+))
+LOG_SAMPLED_LEVELS = os.getenv("LOG_SAMPLED_LEVELS", "INFO")
+LOG_RATE_LIMIT_PER_SECOND = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "0"))
+LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", "50"))
+LOG_SAMPLING_SUMMARY_INTERVAL_S = int(os.getenv("LOG_SAMPLING_SUMMARY_INTERVAL_S", "60"))
+
+class LogSampler:
+    """Decides which low-severity log rows reach LogBledow
+
+    Sample rates are looked up by "modul:funkcja", then "modul", then "*" (default 1.0);
+    the defaults only sample the read handlers of the log and statistics pages. With
+    rate_per_second above 0 every (modul, funkcja) pair also gets a token bucket refilled
+    up to burst. Only levels in sampled_levels are affected; errors always pass.
+    Rows skipped either way are counted and reported in one summary row per interval.
+    """
+
+    def __init__(
+        self,
+        sample_rates: str = LOG_SAMPLE_RATES,
+        sampled_levels: str = LOG_SAMPLED_LEVELS,
+        rate_per_second: float = LOG_RATE_LIMIT_PER_SECOND,
+        burst: int = LOG_RATE_LIMIT_BURST,
+        summary_interval_s: int = LOG_SAMPLING_SUMMARY_INTERVAL_S
+    ):
+        try:
+            self.sample_rates: Dict[str, float] = {k: float(v) for k, v in json.loads(sample_rates or "{}").items()}
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid LOG_SAMPLE_RATES, sampling disabled: {str(e)}")
+            self.sample_rates = {}
+        self.sampled_levels = {level.strip().upper() for level in sampled_levels.split(",") if level.strip()}
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.summary_interval = summary_interval_s
+        self._buckets: Dict[Tuple[str, str], List[float]] = {}
+        self._skipped: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._last_summary = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rate_for(self, modul: str, funkcja: str) -> float:
+        for key in (f"{modul}:{funkcja}", modul, "*"):
+            if key in self.sample_rates:
+                return self.sample_rates[key]
+        return 1.0
+
+    def _take_token(self, key: Tuple[str, str], now: float) -> bool:
+        if self.rate_per_second <= 0:
+            return True
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate_per_second)
+        if tokens < 1:
+            self._buckets[key] = [tokens, now]
+            return False
+        self._buckets[key] = [tokens - 1, now]
+        return True
+
+    def allow(self, poziom: PoziomLogu, modul: str, funkcja: str) -> bool:
+        """Return True if the row should be written"""
+        if getattr(poziom, "value", str(poziom)).upper() not in self.sampled_levels:
+            return True
+        key = (modul, funkcja)
+        rate = self._rate_for(modul, funkcja)
+        with self._lock:
+            if rate < 1.0 and random.random() >= rate:
+                reason = "sampled_out"
+            elif not self._take_token(key, time.monotonic()):
+                reason = "rate_limited"
+            else:
+                return True
+            counts = self._skipped.setdefault(key, {"sampled_out": 0, "rate_limited": 0})
+            counts[reason] += 1
+            return False
+
+    def summary_row(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Drain skipped counters into a single summary row once per interval"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_summary < self.summary_interval:
+                return None
+            self._last_summary = now
+            skipped, self._skipped = self._skipped, {}
+        if not skipped:
+            return None
+        total = sum(sum(counts.values()) for counts in skipped.values())
+        return {
+            "timestamp": datetime.now(pytz.timezone('Europe/Warsaw')),
+            "poziom": PoziomLogu.INFO,
+            "modul_aplikacji": "db_logger",
+            "funkcja": "sampling_summary",
+            "komunikat_bledu": f"Pominięto {total} wpisów logu (próbkowanie/limit)",
+            "szczegoly_techniczne": json.dumps({
+                "interval_s": self.summary_interval,
+                "skipped": {f"{modul}:{funkcja}": counts for (modul, funkcja), counts in skipped.items()}
+            })
+        }
+
+def extract_search_fields(szczegoly: Optional[str]) -> Dict[str, Any]:
+    """Pull paragon_id, file_path and stage out of the JSON details for indexed filtering"""
+    fields = {"paragon_id": None, "file_path": None, "stage": None}
+    if not szczegoly or not szczegoly.startswith("{"):
+        return fields
+    try:
+        details = json.loads(szczegoly)
+    except ValueError:
+        return fields
+    paragon_id = details.get("paragon_id", details.get("receipt_id"))
+    if isinstance(paragon_id, int) or (isinstance(paragon_id, str) and paragon_id.isdigit()):
+        fields["paragon_id"] = int(paragon_id)
+    if isinstance(details.get("file_path"), str):
+        fields["file_path"] = details["file_path"]
+    if isinstance(details.get("stage"), str):
+        fields["stage"] = details["stage"]
+    return fields
+
+class DbLogSink:
+    """Bounded in-memory queue of LogBledow rows written in bulk by a background thread
+
+    Rows are flushed every batch_size rows or flush_interval_ms, whichever comes first.
+    When the queue is full the overflow policy decides: drop_oldest (default) discards
+    the oldest queued row, drop_newest discards the new one, block waits up to
+    block_timeout_ms before dropping. Callers never wait on a database commit.
+    A batch the database rejects is retried write_attempts times with backoff, then
+    written to the file log instead. flush() waiters are kept outside the row queue so
+    the overflow policy can never drop them.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = DB_LOG_QUEUE_SIZE,
+        batch_size: int = DB_LOG_BATCH_SIZE,
+        flush_interval_ms: int = DB_LOG_FLUSH_INTERVAL_MS,
+        overflow_policy: str = DB_LOG_OVERFLOW_POLICY,
+        block_timeout_ms: int = DB_LOG_BLOCK_TIMEOUT_MS,
+        write_attempts: int = DB_LOG_WRITE_ATTEMPTS,
+        sampler: Optional[LogSampler] = None
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000
+        self.write_attempts = max(1, write_attempts)
+        self.sampler = sampler
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "errors": 0, "fallback": 0}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._flush_waiters: List[threading.Event] = []
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def _ensure_started(self) -> None:
+        """Start the flusher thread, also after a fork (Celery prefork children)"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Rows queued in the parent are flushed by the parent
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._flush_waiters = []
+                self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="db-log-sink", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> None:
+        """Queue a row without waiting for the database"""
+        self._ensure_started()
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow_policy == "drop_oldest":
+                try:
+                    self._queue.get_nowait()
+                    self._queue.put_nowait(row)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.stats["dropped"] += 1
+            return
+        self.stats["enqueued"] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, timeout: float = 5) -> bool:
+        """Wait until rows queued so far are written"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        with self._lock:
+            self._flush_waiters.append(done)
+        self._wakeup.set()
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float = 5) -> None:
+        """Flush pending rows and stop the flusher thread"""
+        if self._pid != os.getpid():
+            return
+        if self.sampler is not None:
+            summary = self.sampler.summary_row(force=True)
+            if summary is not None:
+                self.submit(summary)
+        self.flush(timeout)
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            # Woken early by a full batch or a flush() request
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            with self._lock:
+                waiters, self._flush_waiters = self._flush_waiters, []
+
+            # Everything queued before the waiters registered is written before they are released
+            while True:
+                batch: List[Dict[str, Any]] = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                self._write(batch)
+
+            if self.sampler is not None:
+                summary = self.sampler.summary_row()
+                if summary is not None:
+                    self._write([summary])
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        from database import engine
+        for row in batch:
+            row.update(extract_search_fields(row.get("szczegoly_techniczne")))
+        for attempt in range(self.write_attempts):
+            try:
+                with engine.begin() as connection:
+                    connection.execute(LogBledow.__table__.insert(), batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                # Never log through the sink from here: that could feed a failing loop
+                self.stats["errors"] += 1
+                error = e
+                if attempt + 1 < self.write_attempts:
+                    time.sleep(0.2 * 2 ** attempt)
+        logger.error(f"Failed to write {len(batch)} log rows to database, writing them to the file log: {str(error)}")
+        for row in batch:
+            fallback_logger.warning(json.dumps(row, default=str, ensure_ascii=False))
+        self.stats["fallback"] += len(batch)
+
+db_log_sink = DbLogSink(sampler=LogSampler())
+atexit.register(db_log_sink.shutdown)
+
 def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    from database import SessionLocal
-    
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit() 
\ No newline at end of file
+    """Queue a LogBledow row; written in bulk by the background sink"""
+    if db_log_sink.sampler is not None and not db_log_sink.sampler.allow(poziom, modul, funkcja):
+        return
+    db_log_sink.submit({
+        "timestamp": datetime.now(pytz.timezone('Europe/Warsaw')),
+        "poziom": poziom,
+        "modul_aplikacji": modul,
+        "funkcja": funkcja,
+        "komunikat_bledu": komunikat,
+        "szczegoly_techniczne": szczegoly
+    })
+
+class DbLogHandler(logging.Handler):
+    """stdlib logging handler writing records to LogBledow through the sink
+
+    Attached in LOGGING_CONFIG to the loggers of modules that do not call log_to_db
+    themselves. Records of this module (sink failures, fallback rows) are skipped.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.name == __name__ or record.name.startswith(f"{__name__}."):
+            return  # Sink failures must not be queued into the sink
+        try:
+            if record.levelno >= logging.ERROR:
+                poziom = PoziomLogu.ERROR
+            elif record.levelno >= logging.WARNING:
+                poziom = PoziomLogu.WARNING
+            else:
+                poziom = PoziomLogu.INFO
+            szczegoly = None
+            if record.exc_info:
+                szczegoly = json.dumps({
+                    "error_type": record.exc_info[0].__name__ if record.exc_info[0] else None,
+                    "traceback": self.formatter.formatException(record.exc_info) if self.formatter
+                    else logging.Formatter().formatException(record.exc_info)
+                })
+            log_to_db(
+                poziom,
+                record.name[:100],
+                record.funcName[:100],
+                record.getMessage()[:500],
+                szczegoly
+            )
+        except Exception:
+            self.handleError(record)
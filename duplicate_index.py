@@ -0,0 +1,126 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from PIL import Image
+from sqlmodel import select
+from database import SessionLocal
+from models import Paragon
+from config import get_settings
+from functools import lru_cache
+import threading
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Compute a difference hash: one bit per horizontally adjacent pixel comparison"""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def compute_image_hash(image_path: Path) -> str:
+    """Get the perceptual hash of an image file as a hex string"""
+    with Image.open(image_path) as image:
+        return f"{dhash(image):016x}"
+
+def compute_file_hash(path: Path) -> str:
+    """Get the SHA-256 digest of a file's content as a hex string"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance"""
+
+    def __init__(self):
+        self.root: Optional[Tuple[int, int, Dict[int, tuple]]] = None
+        self.size = 0
+
+    def add(self, value: int, item_id: int) -> None:
+        node = (value, item_id, {})
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """Get (distance, item_id) pairs within max_distance, closest first"""
+        if self.root is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, item_id, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                results.append((distance, item_id))
+            # Triangle inequality: only subtrees in [d - max, d + max] can match
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        results.sort()
+        return results
+
+class DuplicateIndex:
+    """In-memory perceptual hash index of uploaded receipts
+
+    Loaded from Paragon.phash on first use; rows added by other processes are picked up
+    incrementally by id, and deleted receipts are filtered out with tombstones.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self._tree = BKTree()
+        self._removed: Set[int] = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """Load receipts with an id above the last one seen"""
+        with SessionLocal() as db:
+            rows = db.exec(
+                select(Paragon.id, Paragon.phash)
+                .where(Paragon.id > self._last_id, Paragon.phash.isnot(None))
+                .order_by(Paragon.id)
+            ).all()
+        for paragon_id, phash in rows:
+            self._tree.add(int(phash, 16), paragon_id)
+            self._last_id = max(self._last_id, paragon_id)
+
+    def find(self, phash: str) -> Optional[Tuple[int, int]]:
+        """Get (paragon_id, distance) of the closest similar receipt, if any"""
+        with self._lock:
+            self._refresh()
+            for distance, paragon_id in self._tree.search(int(phash, 16), self.max_distance):
+                if paragon_id not in self._removed:
+                    return paragon_id, distance
+        return None
+
+    def remove(self, paragon_id: int) -> None:
+        """Exclude a deleted receipt from future lookups"""
+        with self._lock:
+            self._removed.add(paragon_id)
+
+@lru_cache()
+def get_duplicate_index() -> DuplicateIndex:
+    """Get the process-wide duplicate index"""
+    return DuplicateIndex(get_settings().DUPLICATE_MAX_DISTANCE)
@@ -0,0 +1,116 @@
+from typing import Dict, Sequence, Tuple
+from PIL import Image
+import numpy as np
+import cv2
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Steps always run in this order; configuration only selects which ones are enabled
+PREPROCESSING_STEPS = ("grayscale", "crop", "resize", "deskew", "binarize")
+
+def parse_steps(value: str) -> Tuple[str, ...]:
+    """Parse a comma-separated step list from settings, dropping unknown names"""
+    requested = {step.strip().lower() for step in value.split(",") if step.strip()}
+    unknown = requested - set(PREPROCESSING_STEPS)
+    if unknown:
+        logger.warning(f"Unknown OCR preprocessing steps ignored: {', '.join(sorted(unknown))}")
+    return tuple(step for step in PREPROCESSING_STEPS if step in requested)
+
+def _to_gray(image: Image.Image) -> np.ndarray:
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    return np.asarray(image.convert("L"))
+
+def _resize(gray: np.ndarray, target_width: int) -> np.ndarray:
+    """Scale so the receipt is about target_width pixels wide (~300 DPI for an 80mm roll)"""
+    width = gray.shape[1]
+    scale = target_width / width
+    if 0.8 <= scale <= 1.25:
+        return gray
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+def _crop(gray: np.ndarray, min_area_ratio: float = 0.2) -> np.ndarray:
+    """Crop to the largest bright region, i.e. the paper against a darker background"""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    if w * h < min_area_ratio * gray.shape[0] * gray.shape[1]:
+        return gray
+    return gray[y:y + h, x:x + w]
+
+def _skew_angle(gray: np.ndarray) -> float:
+    """Estimate text skew in degrees from the minimum-area rectangle around dark pixels"""
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return 0.0
+    angle = cv2.minAreaRect(points)[-1]
+    # OpenCV reports the rectangle angle in (0, 90]; map it to (-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return float(angle)
+
+def _deskew(gray: np.ndarray, max_angle: float) -> np.ndarray:
+    angle = _skew_angle(gray)
+    if abs(angle) < 0.3 or abs(angle) > max_angle:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    """Adaptive threshold, robust against uneven lighting of phone photos"""
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+    )
+
+def preprocess_for_ocr(
+    image: Image.Image,
+    steps: Sequence[str],
+    target_width: int = 1200,
+    max_skew: float = 15.0
+) -> Tuple[Image.Image, Dict[str, float]]:
+    """
+    Prepare a receipt photo for Tesseract
+
+    Args:
+        image: Source image
+        steps: Enabled steps, see PREPROCESSING_STEPS
+        target_width: Width in pixels the receipt is scaled to
+        max_skew: Larger estimated angles are treated as misdetections and left alone
+
+    Returns:
+        Tuple[Image.Image, Dict[str, float]]: Processed image and per-step timings in ms
+    """
+    timings: Dict[str, float] = {}
+    if not steps:
+        return image, timings
+
+    def timed(name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    # Every other step works on a single channel array
+    gray = timed("grayscale", _to_gray, image)
+    if "crop" in steps:
+        gray = timed("crop", _crop, gray)
+    if "resize" in steps:
+        gray = timed("resize", _resize, gray, target_width)
+    if "deskew" in steps:
+        gray = timed("deskew", _deskew, gray, max_skew)
+    if "binarize" in steps:
+        gray = timed("binarize", _binarize, gray)
+
+    return Image.fromarray(gray), timings
@@ -0,0 +1,160 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from database import engine
+from models import LogBledow
+import logging
+import fcntl
+import json
+import gzip
+import os
+import pytz
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "logs_archive.state.json"
+LOCK_FILE = "logs_archive.lock"
+
+class ArchiveInProgressError(RuntimeError):
+    """Raised when another process is archiving logs, or an interrupted run with another scope is pending"""
+    pass
+
+def _open_compressed(path: Path, compression: str):
+    """Open an archive for appending; gzip members and zstd frames can be concatenated"""
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().stream_writer(open(path, "ab"), closefd=True)
+    return gzip.open(path, "ab")
+
+def _row_to_json(row) -> bytes:
+    return (json.dumps({
+        "id": row.id,
+        "timestamp": row.timestamp.isoformat() if isinstance(row.timestamp, datetime) else row.timestamp,
+        "poziom": getattr(row.poziom, "value", row.poziom),
+        "modul_aplikacji": row.modul_aplikacji,
+        "funkcja": row.funkcja,
+        "komunikat_bledu": row.komunikat_bledu,
+        "szczegoly_techniczne": row.szczegoly_techniczne
+    }, ensure_ascii=False) + "\n").encode("utf-8")
+
+def _save_state(path: Path, state: Dict[str, Any]) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def archive_logs(
+    archive_dir: str = "logs",
+    older_than_days: Optional[int] = None,
+    chunk_size: int = 5000,
+    compression: str = "gzip"
+) -> Dict[str, Any]:
+    """
+    Move LogBledow rows into a compressed NDJSON archive, chunk by chunk
+
+    Rows are read with keyset pagination on id up to the maximum id seen at start,
+    so memory use is bounded by chunk_size and rows logged meanwhile are left alone.
+    Every chunk is written and fsynced, the progress is recorded in a state file and
+    only then the chunk is deleted in its own short transaction. An interrupted run is
+    resumed by the next call with the same older_than_days: it appends to the same
+    archive from the recorded id. A call with a different older_than_days raises
+    ArchiveInProgressError and leaves the interrupted run to be resumed.
+
+    Args:
+        archive_dir: Directory for archives and the state file
+        older_than_days: Only archive rows older than this; None archives everything
+        chunk_size: Rows per chunk and per delete transaction
+        compression: "gzip" or "zstd" (falls back to gzip without zstandard)
+
+    Returns:
+        Dict[str, Any]: Archive file name, archived row count and whether it resumed
+    """
+    directory = Path(archive_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    state_path = directory / STATE_FILE
+
+    with open(directory / LOCK_FILE, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ArchiveInProgressError("Log archival already running")
+
+        resumed = state_path.exists()
+        if resumed:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("older_than_days") != older_than_days:
+                raise ArchiveInProgressError(
+                    f"Interrupted log archival into {state['archive_file']} (older_than_days="
+                    f"{state.get('older_than_days')}) must be resumed with the same older_than_days first"
+                )
+            logger.info(f"Resuming log archival into {state['archive_file']} after id {state['last_id']}")
+        else:
+            if compression == "zstd" and zstandard is None:
+                logger.warning("zstandard not installed, archiving logs with gzip")
+                compression = "gzip"
+            cutoff = None
+            if older_than_days is not None:
+                cutoff = (datetime.now(pytz.timezone('Europe/Warsaw')) - timedelta(days=older_than_days)).isoformat()
+            with engine.connect() as connection:
+                max_id = connection.execute(select(func.max(LogBledow.id))).scalar()
+            if max_id is None:
+                return {"archive_file": None, "rows": 0, "resumed": False}
+            suffix = "zst" if compression == "zstd" else "gz"
+            state = {
+                "archive_file": f"logs_archive_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.{suffix}",
+                "compression": compression,
+                "older_than_days": older_than_days,
+                "cutoff": cutoff,
+                "max_id": max_id,
+                "last_id": 0,
+                "rows": 0
+            }
+            _save_state(state_path, state)
+
+        def in_scope(query):
+            query = query.where(LogBledow.id <= state["max_id"])
+            if state["cutoff"] is not None:
+                query = query.where(LogBledow.timestamp < datetime.fromisoformat(state["cutoff"]))
+            return query
+
+        archive_path = directory / state["archive_file"]
+        with engine.begin() as connection:
+            # Rows up to last_id are already in the archive; finish a delete that was interrupted
+            connection.execute(in_scope(delete(LogBledow).where(LogBledow.id <= state["last_id"])))
+
+        while True:
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    in_scope(select(LogBledow.__table__).where(LogBledow.id > state["last_id"]))
+                    .order_by(LogBledow.id)
+                    .limit(chunk_size)
+                ).all()
+            if not rows:
+                break
+
+            with _open_compressed(archive_path, state["compression"]) as out:
+                out.write(b"".join(_row_to_json(row) for row in rows))
+            with open(archive_path, "rb") as f:
+                os.fsync(f.fileno())
+
+            first_id, last_id = rows[0].id, rows[-1].id
+            state["last_id"] = last_id
+            state["rows"] += len(rows)
+            _save_state(state_path, state)
+
+            with engine.begin() as connection:
+                connection.execute(in_scope(
+                    delete(LogBledow).where(LogBledow.id >= first_id, LogBledow.id <= last_id)
+                ))
+
+        state_path.unlink()
+        logger.info(f"Archived {state['rows']} log rows into {archive_path}")
+        return {"archive_file": str(archive_path), "rows": state["rows"], "resumed": resumed}
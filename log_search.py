@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Optional
+from html import escape
+from sqlalchemy import text
+from sqlmodel import Session
+
+# Sentinels around matches, replaced with <mark> after the text is HTML-escaped
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+def _fts5_query(query: str) -> str:
+    """Turn user input into an FTS5 expression: every term quoted, trailing * kept as prefix search"""
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def _highlight(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return escape(value).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+def search_logs(
+    db: Session,
+    query: Optional[str] = None,
+    poziom: Optional[str] = None,
+    paragon_id: Optional[int] = None,
+    file_path: Optional[str] = None,
+    stage: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Search LogBledow, newest first, with optional full-text matching and structured filters
+
+    Full-text matching uses the logbledow_fts FTS5 index on SQLite and the search
+    tsvector column on PostgreSQL. Results are ordered by id so the engine walks the
+    index backwards and stops after limit rows; before_id continues from the last row.
+
+    Returns:
+        List[Dict[str, Any]]: Log rows; with a query komunikat_bledu and szczegoly_techniczne
+        are HTML-escaped with matches wrapped in <mark>
+    """
+    conditions, params = [], {"limit": limit}
+    for column, value in (("poziom", poziom), ("paragon_id", paragon_id), ("file_path", file_path), ("stage", stage)):
+        if value is not None:
+            conditions.append(f"l.{column} = :{column}")
+            params[column] = value
+
+    columns = "l.id, l.timestamp, l.poziom, l.modul_aplikacji, l.funkcja, l.paragon_id, l.file_path, l.stage"
+    dialect = db.get_bind().dialect.name
+    query = (query or "").strip()
+    order_key = "l.id"
+    if query and dialect == "postgresql":
+        params.update(query=query, options=f"StartSel={MATCH_START},StopSel={MATCH_END},HighlightAll=true")
+        conditions.append("l.search @@ websearch_to_tsquery('simple', :query)")
+        select = (
+            f"SELECT {columns}, "
+            "ts_headline('simple', l.komunikat_bledu, websearch_to_tsquery('simple', :query), :options) AS komunikat_bledu, "
+            "ts_headline('simple', coalesce(l.szczegoly_techniczne, ''), websearch_to_tsquery('simple', :query), :options) AS szczegoly_techniczne "
+            "FROM logbledow l"
+        )
+    elif query:
+        fts_query = _fts5_query(query)
+        if not fts_query:
+            return []
+        params.update(query=fts_query, start=MATCH_START, end=MATCH_END)
+        conditions.append("logbledow_fts MATCH :query")
+        highlights = (
+            "highlight(logbledow_fts, 0, :start, :end) AS komunikat_bledu, "
+            "snippet(logbledow_fts, 1, :start, :end, '…', 24) AS szczegoly_techniczne"
+        )
+        if paragon_id is not None or file_path is not None:
+            # A receipt has few rows: walk its index and probe FTS by rowid
+            select = (
+                f"SELECT {columns}, {highlights} "
+                "FROM logbledow l CROSS JOIN logbledow_fts ON logbledow_fts.rowid = l.id"
+            )
+        else:
+            # FTS5 returns matches in rowid order, so LIMIT stops the scan early
+            select = (
+                f"SELECT {columns}, {highlights} "
+                "FROM logbledow_fts JOIN logbledow l ON l.id = logbledow_fts.rowid"
+            )
+            order_key = "logbledow_fts.rowid"
+    else:
+        select = f"SELECT {columns}, l.komunikat_bledu, l.szczegoly_techniczne FROM logbledow l"
+
+    if before_id is not None:
+        conditions.append(f"{order_key} < :before_id")
+        params["before_id"] = before_id
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = db.execute(text(f"{select}{where} ORDER BY {order_key} DESC LIMIT :limit"), params).mappings().all()
+
+    results = []
+    for row in rows:
+        result = dict(row)
+        if query:
+            result["komunikat_bledu"] = _highlight(result["komunikat_bledu"])
+            result["szczegoly_techniczne"] = _highlight(result["szczegoly_techniczne"])
+        results.append(result)
+    return results
@@ -0,0 +1,56 @@
+from typing import AsyncIterator, List, Tuple
+import asyncio
+import os
+
+def tail_lines(path: str, n: int = 100, block_size: int = 8192) -> Tuple[List[str], int]:
+    """
+    Read the last n lines of a text file by seeking backwards from its end
+
+    Only the blocks containing those lines are read, so the cost does not depend
+    on the file size.
+
+    Returns:
+        Tuple[List[str], int]: The lines (with line endings) and the file size at read
+        time, usable as the starting offset for follow()
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        position = end
+        data = b""
+        # One extra newline: the last line usually ends with one
+        while position > 0 and data.count(b"\n") <= n:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-n:] if n > 0 else [], end
+
+async def follow(path: str, offset: int, poll_interval: float = 1.0) -> AsyncIterator[str]:
+    """
+    Yield lines appended to a file after offset, polling its size
+
+    Truncation or rotation (a new inode) restarts reading from the beginning of the
+    new file. Incomplete trailing lines are held back until their newline arrives.
+    """
+    inode = os.stat(path).st_ino
+    pending = b""
+    while True:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            await asyncio.sleep(poll_interval)
+            continue
+        if stat.st_ino != inode or stat.st_size < offset:
+            inode, offset, pending = stat.st_ino, 0, b""
+        if stat.st_size > offset:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(stat.st_size - offset)
+            offset += len(chunk)
+            *complete, pending = (pending + chunk).split(b"\n")
+            for line in complete:
+                yield line.decode("utf-8", errors="replace")
+        else:
+            await asyncio.sleep(poll_interval)
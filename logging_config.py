@@ -19,6 +19,17 @@ LOGGING_CONFIG = {
             "filename": "app.log",
             "mode": "a",
         },
+        # Writes to LogBledow in batches
+        "db": {
+            "class": "db_logger.DbLogHandler",
+            "level": "WARNING",
+        },
+    },
+    # Modules that only log through the logging module; the others call log_to_db directly
+    "loggers": {
+        name: {"handlers": ["db"]}
+        for name in ("main", "tasks", "database", "worker_loop", "log_archive", "result_cache",
+                     "product_index", "image_preprocessing")
     },
     "root": {
         "handlers": ["console", "file"],
@@ -28,13 +28,17 @@ from urllib.parse import unquote, quote
 from sqlalchemy import func
 import logging
 
-from database import create_db_and_tables, SessionLocal, get_session
+from database import create_db_and_tables, SessionLocal, ReadSessionLocal, get_session, get_async_read_session, dispose_async_engines, get_pool_stats
+from sqlmodel.ext.asyncio.session import AsyncSession
 create_db_and_tables()  # AUTOFIX: ensure tables exist before any logging or config
 from routes import paragony
 from routes import logi
 from models import Paragon, Produkt, StatusParagonu, LogBledow, PoziomLogu
 from config import get_settings
-from ollama_client import verify_ollama_connection
+from ollama_client import verify_ollama_connection, close_ollama_client, get_ollama_pool_stats
+from receipt_processor import get_pdf_text_layer_stats
+from db_logger import db_log_sink
+from product_mapper import get_mapping_stats
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +64,9 @@ async def lifespan(app: FastAPI):
     # Shutdown
     try:
         # Clean up any resources
+        await close_ollama_client()
+        await dispose_async_engines()
+        db_log_sink.shutdown()
         logger.info("Application shutdown complete")
     except Exception as e:
         logger.error(f"Error during shutdown: {str(e)}", exc_info=True)
@@ -121,113 +128,118 @@ app.include_router(paragony.router)
 app.include_router(logi.router)
 
 @app.get("/")
-async def root(request: Request, context: Dict[str, Any] = Depends(get_template_context)):
+async def root(
+    request: Request,
+    context: Dict[str, Any] = Depends(get_template_context),
+    db: AsyncSession = Depends(get_async_read_session)
+):
     """Root endpoint - shows dashboard with statistics and recent activity"""
-    db = SessionLocal()
-    try:
-        # Get statistics
-        total_products = db.query(Produkt).filter(Produkt.paragon_id.is_(None)).count()
-        total_receipts = db.query(Paragon).count()
-        
-        # Get products expiring soon (within 7 days)
-        today = datetime.now()
-        week_later = today + timedelta(days=7)
-        expiring_products = db.query(Produkt).filter(
+    # Get statistics
+    total_products = (await db.exec(
+        select(func.count()).select_from(Produkt).where(Produkt.paragon_id.is_(None))
+    )).one()
+    total_receipts = (await db.exec(select(func.count()).select_from(Paragon))).one()
+
+    # Get products expiring soon (within 7 days)
+    today = datetime.now()
+    week_later = today + timedelta(days=7)
+    expiring_products = (await db.exec(
+        select(Produkt).where(
             Produkt.paragon_id.is_(None),
             Produkt.data_waznosci.isnot(None),
             Produkt.data_waznosci <= week_later,
             Produkt.data_waznosci >= today
-        ).order_by(Produkt.data_waznosci).limit(5).all()
-        
-        # Calculate total savings (sum of all product prices)
-        total_savings = db.query(func.sum(Produkt.cena)).filter(
-            Produkt.paragon_id.is_(None)
-        ).scalar() or 0
-        
-        # Get recent activity
-        recent_activity = []
-        
-        # Add recent receipts
-        recent_receipts = db.query(Paragon).order_by(Paragon.data_wyslania.desc()).limit(3).all()
-        for receipt in recent_receipts:
-            recent_activity.append({
-                'icon': 'receipt',
-                'text': f'Dodano paragon: {receipt.nazwa_pliku_oryginalnego}',
-                'time': receipt.data_wyslania.strftime('%d.%m.%Y %H:%M')
-            })
-        
-        # Add recent product updates
-        recent_products = db.query(Produkt).filter(
-            Produkt.paragon_id.is_(None)
-        ).order_by(Produkt.data_aktualizacji.desc()).limit(3).all()
-        for product in recent_products:
-            recent_activity.append({
-                'icon': 'edit',
-                'text': f'Zaktualizowano produkt: {product.nazwa}',
-                'time': product.data_aktualizacji.strftime('%d.%m.%Y %H:%M')
-            })
-        
-        # Sort activities by time
-        recent_activity.sort(key=lambda x: datetime.strptime(x['time'], '%d.%m.%Y %H:%M'), reverse=True)
-        recent_activity = recent_activity[:5]  # Keep only 5 most recent activities
-        
-        return templates.TemplateResponse(
-            "index.html",
-            {
-                **context,
-                "stats": {
-                    "total_products": total_products,
-                    "expiring_soon": len(expiring_products),
-                    "total_receipts": total_receipts,
-                    "total_savings": round(total_savings, 2)
-                },
-                "expiring_products": expiring_products,
-                "recent_activity": recent_activity
-            }
-        )
-    finally:
-        db.close()
+        ).order_by(Produkt.data_waznosci).limit(5)
+    )).all()
+
+    # Calculate total savings (sum of all product prices)
+    total_savings = (await db.exec(
+        select(func.sum(Produkt.cena)).where(Produkt.paragon_id.is_(None))
+    )).one() or 0
+
+    # Get recent activity
+    recent_activity = []
+
+    # Add recent receipts
+    recent_receipts = (await db.exec(
+        select(Paragon).order_by(Paragon.data_wyslania.desc()).limit(3)
+    )).all()
+    for receipt in recent_receipts:
+        recent_activity.append({
+            'icon': 'receipt',
+            'text': f'Dodano paragon: {receipt.nazwa_pliku_oryginalnego}',
+            'time': receipt.data_wyslania.strftime('%d.%m.%Y %H:%M')
+        })
+
+    # Add recent product updates
+    recent_products = (await db.exec(
+        select(Produkt).where(Produkt.paragon_id.is_(None))
+        .order_by(Produkt.data_aktualizacji.desc()).limit(3)
+    )).all()
+    for product in recent_products:
+        recent_activity.append({
+            'icon': 'edit',
+            'text': f'Zaktualizowano produkt: {product.nazwa}',
+            'time': product.data_aktualizacji.strftime('%d.%m.%Y %H:%M')
+        })
+
+    # Sort activities by time
+    recent_activity.sort(key=lambda x: datetime.strptime(x['time'], '%d.%m.%Y %H:%M'), reverse=True)
+    recent_activity = recent_activity[:5]  # Keep only 5 most recent activities
+
+    return templates.TemplateResponse(
+        "index.html",
+        {
+            **context,
+            "stats": {
+                "total_products": total_products,
+                "expiring_soon": len(expiring_products),
+                "total_receipts": total_receipts,
+                "total_savings": round(total_savings, 2)
+            },
+            "expiring_products": expiring_products,
+            "recent_activity": recent_activity
+        }
+    )
 
 @app.get("/spizarnia", response_class=HTMLResponse)
 async def spizarnia(
     request: Request, 
     context: Dict[str, Any] = Depends(get_template_context),
+    db: AsyncSession = Depends(get_async_read_session),
     msg: Optional[str] = None,
     nazwa: str = '', 
     kategoria: str = '', 
     data_waznosci: str = ''
 ):
-    db = SessionLocal()
-    try:
-        query = db.query(Produkt)
-        if nazwa:
-            query = query.filter(Produkt.nazwa.ilike(f"%{nazwa}%"))
-        if kategoria:
-            query = query.filter(Produkt.kategoria == kategoria)
-        if data_waznosci:
-            query = query.filter(Produkt.data_waznosci == data_waznosci)
-        produkty = query.all()
-        kategorie = ["Nabiał", "Pieczywo", "Mięso", "Warzywa", "Owoce", "Słodycze", "Napoje", "Inne"]
-        # Odczytaj flash message z cookies
-        flash_msg = request.cookies.get('flash_msg')
-        response = templates.TemplateResponse(
-            "spizarnia.html",
-            {
-                **context,
-                "produkty": produkty,
-                "kategorie": kategorie,
-                "f_nazwa": nazwa,
-                "f_kategoria": kategoria,
-                "f_data_waznosci": data_waznosci,
-                "flash_msg": flash_msg
-            }
-        )
-        # Skasuj flash message po odczytaniu
-        if flash_msg:
-            response.delete_cookie('flash_msg')
-        return response
-    finally:
-        db.close()
+    # Receipt lines stay on their receipt; the pantry is the rows without paragon_id
+    query = select(Produkt).where(Produkt.paragon_id.is_(None))
+    if nazwa:
+        query = query.where(Produkt.nazwa.ilike(f"%{nazwa}%"))
+    if kategoria:
+        query = query.where(Produkt.kategoria == kategoria)
+    if data_waznosci:
+        query = query.where(Produkt.data_waznosci == data_waznosci)
+    produkty = (await db.exec(query)).all()
+    kategorie = ["Nabiał", "Pieczywo", "Mięso", "Warzywa", "Owoce", "Słodycze", "Napoje", "Inne"]
+    # Odczytaj flash message z cookies
+    flash_msg = request.cookies.get('flash_msg')
+    response = templates.TemplateResponse(
+        "spizarnia.html",
+        {
+            **context,
+            "produkty": produkty,
+            "kategorie": kategorie,
+            "f_nazwa": nazwa,
+            "f_kategoria": kategoria,
+            "f_data_waznosci": data_waznosci,
+            "flash_msg": flash_msg
+        }
+    )
+    # Skasuj flash message po odczytaniu
+    if flash_msg:
+        response.delete_cookie('flash_msg')
+    return response
 
 @app.get("/spizarnia/edytuj/{produkt_id}", response_class=HTMLResponse)
 async def edytuj_produkt_get(
@@ -241,7 +253,7 @@ async def edytuj_produkt_get(
         if not produkt:
             return templates.TemplateResponse(
                 "spizarnia.html",
-                {**context, "produkty": db.query(Produkt).all(), "error": "Produkt nie znaleziony"}
+                {**context, "produkty": db.query(Produkt).filter(Produkt.paragon_id.is_(None)).all(), "error": "Produkt nie znaleziony"}
             )
         kategorie = ["Nabiał", "Pieczywo", "Mięso", "Warzywa", "Owoce", "Słodycze", "Napoje", "Inne"]
         return templates.TemplateResponse(
@@ -357,18 +369,33 @@ async def statystyki(
         {**context}
     )
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
+@app.get("/api/ollama/pool")
+async def ollama_pool_stats():
+    """Get Ollama connection pool metrics"""
+    return get_ollama_pool_stats()
+
+@app.get("/api/db/pool")
+async def db_pool_stats():
+    """Get database pool occupancy and checkout wait times per engine role"""
+    return get_pool_stats()
+
+@app.get("/api/mapowanie/aliasy")
+async def mapping_alias_stats():
+    """Get how many receipt lines were resolved by learned aliases and mapped without review"""
+    db = ReadSessionLocal()
+    try:
+        return get_mapping_stats(db)
+    finally:
+        db.close()
+
+@app.get("/api/ocr/pdf-text-layer")
+async def pdf_text_layer_stats():
+    """Get how often PDF receipts were read from their text layer instead of OCR"""
+    db = ReadSessionLocal()
+    try:
+        return get_pdf_text_layer_stats(db)
+    finally:
+        db.close()
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,69 @@
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from sqlmodel import SQLModel
+import models  # noqa: F401  Registers tables on SQLModel.metadata
+from database import DATABASE_URL
+
+config = context.config
+target_metadata = SQLModel.metadata
+
+# Full-text search objects are managed by hand in migrations, not by the models
+UNMANAGED_PREFIXES = ("logbledow_fts",)
+UNMANAGED_COLUMNS = {("logbledow", "search")}
+UNMANAGED_INDEXES = {"ix_logbledow_search"}
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    if type_ == "table" and name.startswith(UNMANAGED_PREFIXES):
+        return False
+    if type_ == "column" and (obj.table.name, name) in UNMANAGED_COLUMNS:
+        return False
+    if type_ == "index" and name in UNMANAGED_INDEXES:
+        return False
+    return True
+
+def run_migrations_offline() -> None:
+    """Run migrations in 'offline' mode, emitting SQL instead of executing it"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+        include_object=include_object
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode
+
+    schema.migrate() passes its own connection through config.attributes so the
+    check and the upgrade share one transaction; the alembic CLI builds an engine.
+    """
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_with_connection(connection)
+        return
+
+    section = config.get_section(config.config_ini_section, {})
+    section["sqlalchemy.url"] = DATABASE_URL
+    connectable = engine_from_config(section, prefix="sqlalchemy.", poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        _run_with_connection(connection)
+
+def _run_with_connection(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+        include_object=include_object
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
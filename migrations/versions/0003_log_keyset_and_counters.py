@@ -0,0 +1,91 @@
+"""log keyset index and level counters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEVELS = ('ERROR', 'WARNING', 'INFO')
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('logbledow', schema=None) as batch_op:
+        batch_op.create_index('ix_logbledow_poziom_timestamp', ['poziom', 'timestamp', 'id'], unique=False)
+
+    # The poziomlogu type already exists on PostgreSQL
+    poziom_type = sa.Enum(*LEVELS, name='poziomlogu').with_variant(
+        postgresql.ENUM(*LEVELS, name='poziomlogu', create_type=False), 'postgresql'
+    )
+    op.create_table('loglicznik',
+    sa.Column('poziom', poziom_type, nullable=False),
+    sa.Column('liczba', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('poziom')
+    )
+    # One statement per level: a UNION ALL would type the literals as text, which
+    # PostgreSQL does not convert to poziomlogu implicitly
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for level in LEVELS:
+        value = f"CAST('{level}' AS poziomlogu)" if postgres else f"'{level}'"
+        op.execute(
+            f"INSERT INTO loglicznik (poziom, liczba) "
+            f"SELECT {value}, COUNT(*) FROM logbledow WHERE poziom = '{level}'"
+        )
+
+    # Every logbledow insert updates its level's single counter row, so concurrent
+    # writers of one level serialize on that row until they commit. db_logger writes
+    # through one flusher thread per process, one transaction per batch, which keeps
+    # the waiters to one per process; shard the counter rows if that stops holding.
+    if postgres:
+        op.execute("""
+            CREATE FUNCTION logbledow_count() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE loglicznik SET liczba = liczba + 1 WHERE poziom = NEW.poziom;
+                ELSE
+                    UPDATE loglicznik SET liczba = liczba - 1 WHERE poziom = OLD.poziom;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_count AFTER INSERT OR DELETE ON logbledow
+            FOR EACH ROW EXECUTE FUNCTION logbledow_count()
+        """)
+    else:
+        op.execute("""
+            CREATE TRIGGER logbledow_count_insert AFTER INSERT ON logbledow BEGIN
+                UPDATE loglicznik SET liczba = liczba + 1 WHERE poziom = NEW.poziom;
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_count_delete AFTER DELETE ON logbledow BEGIN
+                UPDATE loglicznik SET liczba = liczba - 1 WHERE poziom = OLD.poziom;
+            END
+        """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER logbledow_count ON logbledow")
+        op.execute("DROP FUNCTION logbledow_count()")
+    else:
+        op.execute("DROP TRIGGER logbledow_count_insert")
+        op.execute("DROP TRIGGER logbledow_count_delete")
+    op.drop_table('loglicznik')
+
+    with op.batch_alter_table('logbledow', schema=None) as batch_op:
+        batch_op.drop_index('ix_logbledow_poziom_timestamp')
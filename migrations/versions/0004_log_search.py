@@ -0,0 +1,165 @@
+"""log full-text search and structured fields
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Any, Dict, Optional, Sequence, Union
+import json
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 10000
+
+
+def extract_search_fields(szczegoly: Optional[str]) -> Dict[str, Any]:
+    """Copy of db_logger.extract_search_fields as of this revision
+
+    Frozen here so later changes to the application module cannot alter, or break,
+    what this migration backfills.
+    """
+    fields = {"paragon_id": None, "file_path": None, "stage": None}
+    if not szczegoly or not szczegoly.startswith("{"):
+        return fields
+    try:
+        details = json.loads(szczegoly)
+    except ValueError:
+        return fields
+    paragon_id = details.get("paragon_id", details.get("receipt_id"))
+    if isinstance(paragon_id, int) or (isinstance(paragon_id, str) and paragon_id.isdigit()):
+        fields["paragon_id"] = int(paragon_id)
+    if isinstance(details.get("file_path"), str):
+        fields["file_path"] = details["file_path"]
+    if isinstance(details.get("stage"), str):
+        fields["stage"] = details["stage"]
+    return fields
+
+
+def _backfill_search_fields() -> None:
+    bind = op.get_bind()
+    logs = sa.table(
+        'logbledow',
+        sa.column('id', sa.Integer),
+        sa.column('szczegoly_techniczne', sa.String),
+        sa.column('paragon_id', sa.Integer),
+        sa.column('file_path', sa.String),
+        sa.column('stage', sa.String)
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(logs.c.id, logs.c.szczegoly_techniczne)
+            .where(logs.c.id > last_id, logs.c.szczegoly_techniczne.like('{%'))
+            .order_by(logs.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        updates = [
+            {"row_id": row.id, **fields}
+            for row in rows
+            if any((fields := extract_search_fields(row.szczegoly_techniczne)).values())
+        ]
+        if updates:
+            bind.execute(
+                logs.update().where(logs.c.id == sa.bindparam('row_id')).values(
+                    paragon_id=sa.bindparam('paragon_id'),
+                    file_path=sa.bindparam('file_path'),
+                    stage=sa.bindparam('stage')
+                ),
+                updates
+            )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('logbledow', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('paragon_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('file_path', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        batch_op.add_column(sa.Column('stage', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_logbledow_paragon_id'), ['paragon_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_logbledow_file_path'), ['file_path'], unique=False)
+        batch_op.create_index(batch_op.f('ix_logbledow_stage'), ['stage'], unique=False)
+
+    _backfill_search_fields()
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE logbledow ADD COLUMN search tsvector GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(komunikat_bledu, '') || ' ' || coalesce(szczegoly_techniczne, ''))
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_logbledow_search ON logbledow USING GIN (search)")
+    else:
+        # External-content FTS5 index: the text lives only in logbledow, triggers keep it in sync
+        op.execute("""
+            CREATE VIRTUAL TABLE logbledow_fts USING fts5(
+                komunikat_bledu, szczegoly_techniczne,
+                content='logbledow', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_fts_insert AFTER INSERT ON logbledow BEGIN
+                INSERT INTO logbledow_fts (rowid, komunikat_bledu, szczegoly_techniczne)
+                VALUES (NEW.id, NEW.komunikat_bledu, NEW.szczegoly_techniczne);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_fts_delete AFTER DELETE ON logbledow BEGIN
+                INSERT INTO logbledow_fts (logbledow_fts, rowid, komunikat_bledu, szczegoly_techniczne)
+                VALUES ('delete', OLD.id, OLD.komunikat_bledu, OLD.szczegoly_techniczne);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_fts_update AFTER UPDATE OF komunikat_bledu, szczegoly_techniczne ON logbledow BEGIN
+                INSERT INTO logbledow_fts (logbledow_fts, rowid, komunikat_bledu, szczegoly_techniczne)
+                VALUES ('delete', OLD.id, OLD.komunikat_bledu, OLD.szczegoly_techniczne);
+                INSERT INTO logbledow_fts (rowid, komunikat_bledu, szczegoly_techniczne)
+                VALUES (NEW.id, NEW.komunikat_bledu, NEW.szczegoly_techniczne);
+            END
+        """)
+        op.execute("INSERT INTO logbledow_fts (logbledow_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_logbledow_search")
+        op.execute("ALTER TABLE logbledow DROP COLUMN search")
+    else:
+        op.execute("DROP TRIGGER logbledow_fts_insert")
+        op.execute("DROP TRIGGER logbledow_fts_delete")
+        op.execute("DROP TRIGGER logbledow_fts_update")
+        op.execute("DROP TABLE logbledow_fts")
+
+    with op.batch_alter_table('logbledow', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_logbledow_stage'))
+        batch_op.drop_index(batch_op.f('ix_logbledow_file_path'))
+        batch_op.drop_index(batch_op.f('ix_logbledow_paragon_id'))
+        batch_op.drop_column('stage')
+        batch_op.drop_column('file_path')
+        batch_op.drop_column('paragon_id')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # Dropping columns in batch mode recreates logbledow on SQLite, which drops the
+        # level counter triggers of revision 0003
+        op.execute("""
+            CREATE TRIGGER logbledow_count_insert AFTER INSERT ON logbledow BEGIN
+                UPDATE loglicznik SET liczba = liczba + 1 WHERE poziom = NEW.poziom;
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER logbledow_count_delete AFTER DELETE ON logbledow BEGIN
+                UPDATE loglicznik SET liczba = liczba - 1 WHERE poziom = OLD.poziom;
+            END
+        """)
@@ -4,7 +4,7 @@ from sqlmodel import SQLModel, Field, Relationship, select
 from enum import Enum
 from pydantic import validator, constr
 from decimal import Decimal
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Integer, Index, UniqueConstraint
 import pytz
 
 class StatusParagonu(str, Enum):
@@ -98,9 +98,16 @@ class Paragon(SQLModel, table=True):
     blad_przetwarzania: Optional[str] = None
     status_szczegolowy: Optional[str] = None
     progress_percentage: Optional[int] = Field(default=0)  # New field for tracking progress
+    phash: Optional[str] = Field(default=None, index=True)  # Perceptual hash for similar-receipt warnings
+    sha256: Optional[str] = Field(default=None, index=True)  # Content hash for exact duplicate detection
+    sklep: Optional[str] = None  # Store name read from the receipt
     
     # Relationships
-    produkty: List[Produkt] = Relationship(back_populates="paragon")
+    # Receipt lines belong to the receipt; a NULL paragon_id would turn them into pantry products
+    produkty: List[Produkt] = Relationship(
+        back_populates="paragon",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan"}
+    )
     
     @validator('mime_type_pliku')
     def validate_mime_type(cls, v):
@@ -109,11 +116,45 @@ class Paragon(SQLModel, table=True):
             raise ValueError(f'Niedozwolony typ pliku. Dozwolone typy: {", ".join(allowed_types)}')
         return v
 
+class AliasProduktu(SQLModel, table=True):
+    """Confirmed mapping of a normalized receipt line name, per store, to a pantry product"""
+    __table_args__ = (UniqueConstraint("nazwa", "sklep", name="uq_aliasproduktu_nazwa_sklep"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nazwa: str  # product_index.normalize_name of the receipt line
+    sklep: str = ""  # Normalized store name, empty when the store is unknown
+    produkt_id: int = Field(sa_column=Column(Integer, ForeignKey("produkt.id", ondelete="CASCADE"), nullable=False, index=True))
+    liczba_potwierdzen: int = 1  # Times a user confirmed this mapping
+    liczba_uzyc: int = 0  # Receipt lines resolved through this alias
+    data_aktualizacji: datetime = Field(default_factory=datetime.utcnow)
+
+class LicznikMapowania(SQLModel, table=True):
+    """Receipt line counts of the mapping pipeline (lines, alias hits, auto-mapped lines)"""
+    klucz: str = Field(primary_key=True)
+    liczba: int = 0
+
+class LicznikOCR(SQLModel, table=True):
+    """Text extraction counts (PDFs read from their text layer, PDFs that needed OCR)"""
+    klucz: str = Field(primary_key=True)
+    liczba: int = 0
+
 class LogBledow(SQLModel, table=True):
+    # Keyset pagination of the /logi list filtered by level
+    __table_args__ = (Index("ix_logbledow_poziom_timestamp", "poziom", "timestamp", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     timestamp: datetime = Field(default_factory=lambda: datetime.now(pytz.timezone('Europe/Warsaw')), index=True)
     poziom: PoziomLogu
     modul_aplikacji: constr(min_length=1, max_length=100)
     funkcja: constr(min_length=1, max_length=100)
     komunikat_bledu: constr(min_length=1, max_length=500)
-    szczegoly_techniczne: Optional[str] = None 
\ No newline at end of file
+    szczegoly_techniczne: Optional[str] = None
+    # Extracted from szczegoly_techniczne by db_logger for structured search
+    paragon_id: Optional[int] = Field(default=None, index=True)
+    file_path: Optional[str] = Field(default=None, index=True)
+    stage: Optional[str] = Field(default=None, index=True)
+
+class LogLicznik(SQLModel, table=True):
+    """Row count of LogBledow per level, kept current by database triggers"""
+    poziom: PoziomLogu = Field(primary_key=True)
+    liczba: int = 0
@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 from config import get_settings
 import logging
 from ollama import AsyncClient, Client, RequestError, ResponseError
@@ -7,10 +7,10 @@ import aiohttp
 import asyncio
 from models import LogBledow, PoziomLogu
 from db_logger import log_to_db
-from database import SessionLocal
 import json
 import os
 import httpx
+import weakref
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 logger = logging.getLogger(__name__)
@@ -37,18 +37,80 @@ class OllamaClient:
         self.base_url = self.settings.OLLAMA_API_URL
         self.model = self.settings.OLLAMA_MODEL
         self.timeout = self.settings.OLLAMA_TIMEOUT
+        self.http2 = self.settings.OLLAMA_HTTP2 and _http2_available()
+        if self.settings.OLLAMA_HTTP2 and not self.http2:
+            logger.warning("OLLAMA_HTTP2 is enabled but the h2 package is not installed, falling back to HTTP/1.1")
+        # Keep a reference to the transport so pool statistics can be read from it
+        self.transport = httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=self.settings.OLLAMA_MAX_KEEPALIVE,
+                keepalive_expiry=self.settings.OLLAMA_KEEPALIVE_EXPIRY
+            ),
+            verify=False  # Disable SSL verification for local development
+        )
         self.client = httpx.AsyncClient(
             base_url=self.base_url,
             timeout=self.timeout,
-            verify=False  # Disable SSL verification for local development
+            transport=self.transport
         )
+        self.metrics = {
+            "requests_total": 0,
+            "in_flight": 0,
+            "connections_opened": 0
+        }
+        self._seen_streams = weakref.WeakSet()
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
         await self.client.aclose()
 
+    async def _post(self, url: str, payload: Dict[str, Any]) -> httpx.Response:
+        """Send a POST request through the pool and record connection reuse"""
+        self.metrics["in_flight"] += 1
+        try:
+            response = await self.client.post(url, json=payload)
+        finally:
+            self.metrics["in_flight"] -= 1
+        self.metrics["requests_total"] += 1
+        self._track_connection(response)
+        return response
+
+    def _track_connection(self, response: httpx.Response) -> None:
+        """Count a new connection when the response arrived on a stream not seen before"""
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        try:
+            if stream in self._seen_streams:
+                return
+            self._seen_streams.add(stream)
+        except TypeError:
+            pass  # Stream type does not support weak references, count it as new
+        self.metrics["connections_opened"] += 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool metrics"""
+        pool = getattr(self.transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        total = self.metrics["requests_total"]
+        reused = max(total - self.metrics["connections_opened"], 0)
+        return {
+            **self.metrics,
+            "open_connections": len(connections),
+            "idle": idle,
+            "reuse_ratio": round(reused / total, 3) if total else 0.0,
+            "http2": self.http2
+        }
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -71,7 +133,7 @@ class OllamaClient:
             if system:
                 logger.debug(f"System prompt length: {len(system)}")
 
-            response = await self.client.post("/api/generate", json=payload)
+            response = await self._post("/api/generate", payload)
             response.raise_for_status()
             return response.json()
         except httpx.TimeoutException as e:
@@ -89,6 +151,87 @@ class OllamaClient:
             logger.error(f"Unexpected error while generating text: {str(e)}")
             raise OllamaError(f"Unexpected error: {str(e)}")
 
+    async def generate_stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate text using Ollama model, consuming the NDJSON token stream
+        
+        Args:
+            prompt: The input prompt
+            system: Optional system prompt
+            on_chunk: Called with every text fragment; returning True stops generation
+            
+        Returns:
+            Dict[str, Any]: Response in the same shape as generate(), with 'stopped_early' set
+                when on_chunk ended the stream before Ollama finished
+                
+        Not retried here: on_chunk callers keep parser state, so a retry has to restart them too.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True
+        }
+        if system:
+            payload["system"] = system
+
+        logger.debug(f"Streaming request to Ollama with timeout {self.timeout}s, model: {self.model}")
+
+        parts = []
+        result: Dict[str, Any] = {"model": self.model, "done": False, "stopped_early": False}
+        self.metrics["in_flight"] += 1
+        try:
+            async with self.client.stream("POST", "/api/generate", json=payload) as response:
+                self.metrics["requests_total"] += 1
+                self._track_connection(response)
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaModelError(f"Ollama error: {chunk['error']}")
+
+                    text = chunk.get("response", "")
+                    if text:
+                        parts.append(text)
+                        if on_chunk and on_chunk(text):
+                            # Leaving the context closes the connection, which aborts generation
+                            result["stopped_early"] = True
+                            break
+
+                    if chunk.get("done"):
+                        result.update({k: v for k, v in chunk.items() if k != "response"})
+                        break
+
+            result["response"] = "".join(parts)
+            return result
+        except httpx.TimeoutException as e:
+            logger.error(f"Timeout while streaming text: {str(e)}")
+            raise OllamaTimeoutError(f"Request timed out after {self.timeout} seconds. The receipt may be too complex or the model may be overloaded.")
+        except httpx.RequestError as e:
+            logger.error(f"Connection error while streaming text: {str(e)}")
+            raise OllamaConnectionError(f"Failed to connect to Ollama: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error while streaming text: {str(e)}")
+            if e.response.status_code == 404:
+                raise OllamaModelError(f"Model {self.model} not found")
+            raise OllamaError(f"HTTP error: {str(e)}")
+        except OllamaError:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming text: {str(e)}")
+            raise OllamaError(f"Unexpected error: {str(e)}")
+        finally:
+            self.metrics["in_flight"] -= 1
+
 async def verify_ollama_connection() -> bool:
     """
     Verify that Ollama service is running and accessible
@@ -141,30 +284,65 @@ async def verify_model_availability() -> bool:
         logger.error(f"Failed to verify model availability: {str(e)}")
         return False
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
+# Process-wide pooled client, bound to the event loop it was created on
+_shared_client: Optional[OllamaClient] = None
+_shared_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _http2_available() -> bool:
     try:
-        with SessionLocal() as db:
-            log = LogBledow(
-                poziom=poziom,
-                modul_aplikacji=modul,
-                funkcja=funkcja,
-                komunikat_bledu=komunikat,
-                szczegoly_techniczne=szczegoly
-            )
-            db.add(log)
-            db.commit()
-    except Exception as e:
-        # Fallback to regular logging if database logging fails
-        logger.error(f"Failed to log to database: {str(e)}")
-        logger.error(f"Original log message: {komunikat}")
-        if szczegoly:
-            logger.error(f"Details: {szczegoly}")
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def get_ollama_client() -> OllamaClient:
+    """Get the shared pooled Ollama client for the running event loop"""
+    global _shared_client, _shared_client_loop
+    loop = asyncio.get_running_loop()
+    if _shared_client is None or _shared_client_loop is not loop:
+        if _shared_client is not None:
+            # Connections of a finished loop cannot be reused, drop them
+            logger.debug("Event loop changed, creating a new pooled Ollama client")
+        _shared_client = OllamaClient()
+        _shared_client_loop = loop
+    return _shared_client
+
+def get_ollama_pool_stats() -> Dict[str, Any]:
+    """Get metrics of the shared Ollama connection pool"""
+    if _shared_client is None:
+        return {}
+    return _shared_client.pool_stats()
+
+async def close_ollama_client() -> None:
+    """Close the shared Ollama client, used by FastAPI lifespan and Celery worker shutdown"""
+    global _shared_client, _shared_client_loop
+    client, loop = _shared_client, _shared_client_loop
+    _shared_client = None
+    _shared_client_loop = None
+    if client is None:
+        return
+
+    user_activity_logger.log_ollama_operation("close_pool", client.pool_stats())
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if loop is running_loop:
+        await client.close()
+    else:
+        logger.debug("Pooled Ollama client belongs to a finished event loop, skipping close")
 
 async def ollama_generate(prompt: str, system: Optional[str] = None) -> Dict[str, Any]:
-    """Helper function to generate text using Ollama"""
-    async with OllamaClient() as client:
-        return await client.generate(prompt, system)
+    """Helper function to generate text using the shared pooled Ollama client"""
+    return await get_ollama_client().generate(prompt, system)
+
+async def ollama_generate_stream(
+    prompt: str,
+    system: Optional[str] = None,
+    on_chunk: Optional[Callable[[str], bool]] = None
+) -> Dict[str, Any]:
+    """Helper function to stream text from Ollama using the shared pooled client"""
+    return await get_ollama_client().generate_stream(prompt, system, on_chunk)
 
 async def ollama_generate_old(
     prompt: str,
@@ -0,0 +1,276 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from result_cache import make_key
+import numpy as np
+import threading
+import logging
+import fcntl
+import httpx
+import time
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 64  # make_key hex digest
+RETRY_AFTER_S = 60  # Fuzzy matching only, without calling the embedder, after a failure
+EMBED_BATCH_SIZE = 64  # Texts per embedder request; each batch is stored as soon as it arrives
+HEADER = np.dtype("<u4")  # vector dimension
+
+class EmbeddingError(Exception):
+    """Raised when embeddings cannot be computed"""
+    pass
+
+class EmbeddingStore:
+    """Append-only file of text embeddings for one model, shared by processes on the host
+
+    The file holds the vector dimension followed by fixed-size records of a 64-byte key
+    and float32 vector. Appends take an exclusive lock; readers pick up records appended
+    by other processes from the last offset they read.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.dim: Optional[int] = None
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _record_size(self) -> int:
+        return KEY_BYTES + 4 * self.dim
+
+    def _read_new(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                if self.dim is None:
+                    header = f.read(HEADER.itemsize)
+                    if len(header) < HEADER.itemsize:
+                        return
+                    self.dim = int(np.frombuffer(header, dtype=HEADER)[0])
+                    self._offset = HEADER.itemsize
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        record_size = self._record_size()
+        count = len(data) // record_size  # A torn last record is read once it is complete
+        records = np.frombuffer(data[:count * record_size], dtype=np.uint8).reshape(count, record_size)
+        for record in records:
+            self._vectors[record[:KEY_BYTES].tobytes().decode("ascii")] = record[KEY_BYTES:].view("<f4")
+        self._offset += count * record_size
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors of the given keys"""
+        keys = list(keys)
+        with self._lock:
+            if any(key not in self._vectors for key in keys):
+                self._read_new()
+            return {key: self._vectors[key] for key in keys if key in self._vectors}
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        """Append vectors, skipping keys another process stored meanwhile"""
+        if not vectors:
+            return
+        with self._lock, open(self.path, "ab+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._read_new()
+                dim = len(next(iter(vectors.values())))
+                if self.dim is None:
+                    f.truncate(0)
+                    f.write(np.array([dim], dtype=HEADER).tobytes())
+                    self.dim, self._offset = dim, HEADER.itemsize
+                elif dim != self.dim:
+                    raise EmbeddingError(f"Embedding dimension changed from {self.dim} to {dim}, clear {self.path}")
+                # Drop a torn record left by a crashed writer so new records stay aligned
+                f.truncate(self._offset)
+                for key, vector in vectors.items():
+                    if key not in self._vectors:
+                        vector = np.asarray(vector, dtype="<f4")
+                        f.write(key.encode("ascii") + vector.tobytes())
+                        self._vectors[key] = vector
+                f.flush()
+                self._offset = f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class OllamaEmbedder:
+    """Computes embeddings with a local Ollama model, many texts per /api/embed request"""
+
+    def __init__(self, base_url: str, model: str, timeout: float):
+        self.model = model
+        self.client = httpx.Client(base_url=base_url, timeout=timeout)
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        try:
+            response = self.client.post("/api/embed", json={"model": self.model, "input": texts})
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            raise EmbeddingError(f"Ollama embeddings failed for model {self.model}: {str(e)}")
+        if len(embeddings) != len(texts):
+            raise EmbeddingError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return [np.asarray(vector, dtype=np.float32) for vector in embeddings]
+
+class _BruteForceIndex:
+    """Exact nearest neighbours by one matrix product over all vectors"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._matrix: Optional[Tuple[np.ndarray, np.ndarray]] = None  # (ids, vectors), dropped on change
+
+    def add(self, ids: List[int], vectors: np.ndarray) -> None:
+        self._vectors.update(zip(ids, vectors))
+        self._matrix = None
+
+    def remove(self, produkt_id: int) -> None:
+        if self._vectors.pop(produkt_id, None) is not None:
+            self._matrix = None
+
+    def knn(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        if not self._vectors:
+            return [np.empty(0, dtype=np.int64) for _ in queries]
+        if self._matrix is None:
+            self._matrix = (np.fromiter(self._vectors, dtype=np.int64), np.stack(list(self._vectors.values())))
+        ids, matrix = self._matrix
+        similarities = queries @ matrix.T
+        k = min(k, len(ids))
+        return [ids[np.argpartition(-row, k - 1)[:k]] for row in similarities]
+
+class _HnswIndex:
+    """Approximate nearest neighbours with hnswlib
+
+    Re-adding an id updates its point in place; removed ids stay as deleted slots until
+    the pantry index is rebuilt, which starts a fresh graph.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        self._live: set = set()
+
+    def add(self, ids: List[int], vectors: np.ndarray) -> None:
+        needed = self._index.element_count + len(ids)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, ids)
+        self._live.update(ids)
+
+    def remove(self, produkt_id: int) -> None:
+        if produkt_id in self._live:
+            self._index.mark_deleted(produkt_id)
+            self._live.discard(produkt_id)
+
+    def knn(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        k = min(k, len(self._live))
+        if k == 0:
+            return [np.empty(0, dtype=np.int64) for _ in queries]
+        self._index.set_ef(max(50, 2 * k))
+        labels, _ = self._index.knn_query(queries, k=k)
+        return [row.astype(np.int64) for row in labels]
+
+class PantryEmbeddings:
+    """Embeddings of pantry names with a nearest-neighbour index, kept in step with PantryIndex
+
+    Products are queued by add() and embedded on the next query, from the persistent
+    store when their name was embedded before and through the embedder otherwise.
+    compute() only reads and writes the store, so PantryIndex calls it without holding
+    its lock; the methods changing the index run under that lock.
+    """
+
+    def __init__(self, store: EmbeddingStore, embedder: OllamaEmbedder):
+        self.store = store
+        self.embedder = embedder
+        self._pending: Dict[int, str] = {}
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._index = None
+        self._failed_at: Optional[float] = None
+
+    def add(self, produkt_id: int, normalized: str) -> None:
+        self.remove(produkt_id)
+        self._pending[produkt_id] = normalized
+
+    def remove(self, produkt_id: int) -> None:
+        self._pending.pop(produkt_id, None)
+        if self._vectors.pop(produkt_id, None) is not None:
+            self._index.remove(produkt_id)
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._vectors.clear()
+        self._index = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit-length embeddings of normalized texts, computing only those not stored yet"""
+        keys = [make_key(self.embedder.model, text) for text in texts]
+        cached = self.store.get_many(keys)
+        missing = list({key: text for key, text in zip(keys, texts) if key not in cached}.items())
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = dict(missing[start:start + EMBED_BATCH_SIZE])
+            computed = dict(zip(batch, self.embedder.embed(list(batch.values()))))
+            self.store.put_many(computed)
+            cached.update(computed)
+        if not keys:
+            return np.empty((0, self.store.dim or 0), dtype=np.float32)
+        vectors = np.stack([cached[key] for key in keys]).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def pending(self) -> Dict[int, str]:
+        """Products added since the last query, to pass to compute()"""
+        return dict(self._pending)
+
+    def compute(self, normalized: List[str], pending: Dict[int, str]) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+        """Embeddings of the queries and of the pending products, without touching the index"""
+        if self._failed_at is not None and time.monotonic() - self._failed_at < RETRY_AFTER_S:
+            raise EmbeddingError("Embeddings unavailable after a recent failure")
+        try:
+            vectors = self.embed(list(pending.values()) + normalized)
+        except EmbeddingError:
+            self._failed_at = time.monotonic()
+            raise
+        self._failed_at = None
+        return vectors[len(pending):], dict(zip(pending, vectors[:len(pending)]))
+
+    def index(self, pending: Dict[int, str], vectors: Dict[int, np.ndarray]) -> None:
+        """Index computed vectors of products still pending under the same name"""
+        ids = [produkt_id for produkt_id, text in pending.items() if self._pending.get(produkt_id) == text]
+        if not ids:
+            return
+        matrix = np.stack([vectors[produkt_id] for produkt_id in ids])
+        if self._index is None:
+            self._index = _HnswIndex(matrix.shape[1]) if hnswlib is not None else _BruteForceIndex(matrix.shape[1])
+        self._index.add(ids, matrix)
+        self._vectors.update(zip(ids, matrix))
+        for produkt_id in ids:
+            del self._pending[produkt_id]
+
+    def knn(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        """Ids of the k nearest indexed pantry products of each query embedding"""
+        if self._index is None:
+            return [np.empty(0, dtype=np.int64) for _ in queries]
+        return self._index.knn(queries, k)
+
+    def similarity(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Cosine similarity of one query embedding to products, NaN for products without one"""
+        similarities = np.full(len(ids), np.nan, dtype=np.float32)
+        known = [i for i, produkt_id in enumerate(ids.tolist()) if produkt_id in self._vectors]
+        if known:
+            similarities[known] = np.stack([self._vectors[int(ids[i])] for i in known]) @ query
+        return similarities
+
+def create_pantry_embeddings(settings) -> Optional[PantryEmbeddings]:
+    """Pantry embeddings configured by PRODUCT_EMBEDDINGS_* settings, or None when disabled"""
+    if not settings.PRODUCT_EMBEDDINGS_ENABLED:
+        return None
+    model = settings.PRODUCT_EMBEDDINGS_MODEL
+    store = EmbeddingStore(Path(settings.PRODUCT_EMBEDDINGS_DIR) / f"{make_key(model)[:16]}.bin")
+    if hnswlib is None:
+        logger.info("hnswlib is not installed, searching pantry embeddings by brute force")
+    return PantryEmbeddings(store, OllamaEmbedder(settings.OLLAMA_API_URL, model, settings.PRODUCT_EMBEDDINGS_TIMEOUT))
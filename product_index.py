@@ -0,0 +1,259 @@
+from typing import Dict, List, Optional, Set, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from rapidfuzz import fuzz, process
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import select
+from database import SessionLocal
+from models import Produkt
+from config import get_settings
+from product_embeddings import PantryEmbeddings, EmbeddingError, create_pantry_embeddings
+import unicodedata
+import threading
+import logging
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+# Scoring every indexed name is cheap below this size; above it trigram overlap picks candidates
+MAX_CANDIDATES = 500
+# Nearest pantry names by embedding added to each query's candidates
+SEMANTIC_CANDIDATES = 20
+
+_NON_ALNUM = re.compile(r"[^0-9a-z%.]+")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip Polish diacritics and punctuation: "MLEKO UHT 3,2% 1L" -> "mleko uht 3.2% 1l" """
+    name = _DECIMAL_COMMA.sub(".", name.lower().replace("ł", "l"))
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_NON_ALNUM.sub(" ", name).split())
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PantryIndex:
+    """In-memory fuzzy-match index of pantry products (Produkt rows without paragon_id)
+
+    Names are normalized once and posted into a trigram inverted index, so a lookup
+    scores only the names sharing the most trigrams with the query instead of the
+    whole pantry. Commits in this process update the index incrementally through
+    session events; rows added by other processes are picked up by id, and the index
+    is rebuilt after max_age seconds to catch their updates and deletes.
+
+    With embeddings, the nearest pantry names by meaning join the trigram candidates
+    and each score blends WRatio with cosine similarity by semantic_weight. Embeddings
+    are computed between two locked sections, so a slow model server never blocks
+    other lookups or commit-time index updates.
+    """
+
+    def __init__(self, max_age: float = 300, embeddings: Optional[PantryEmbeddings] = None, semantic_weight: float = 0.5):
+        self.max_age = max_age
+        self.embeddings = embeddings
+        self.semantic_weight = semantic_weight
+        self._products: Dict[int, Tuple[str, str, str]] = {}  # id -> (nazwa, kategoria, normalized)
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._posting_arrays: Dict[str, np.ndarray] = {}  # postings as arrays, dropped when they change
+        self._last_id = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def _add(self, produkt_id: int, nazwa: str, kategoria) -> None:
+        self._remove(produkt_id)
+        kategoria = getattr(kategoria, "value", kategoria)
+        normalized = normalize_name(nazwa)
+        self._products[produkt_id] = (nazwa, kategoria, normalized)
+        if self.embeddings is not None:
+            self.embeddings.add(produkt_id, normalized)
+        for gram in trigrams(normalized):
+            self._postings[gram].add(produkt_id)
+            self._posting_arrays.pop(gram, None)
+
+    def _remove(self, produkt_id: int) -> None:
+        entry = self._products.pop(produkt_id, None)
+        if entry is None:
+            return
+        if self.embeddings is not None:
+            self.embeddings.remove(produkt_id)
+        for gram in trigrams(entry[2]):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(produkt_id)
+                self._posting_arrays.pop(gram, None)
+                if not posting:
+                    del self._postings[gram]
+
+    def _refresh(self) -> None:
+        """Rebuild when stale, otherwise load pantry products with an id above the last one seen"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self._products.clear()
+            self._postings.clear()
+            self._posting_arrays.clear()
+            if self.embeddings is not None:
+                self.embeddings.clear()
+            self._last_id = 0
+            self._loaded_at = time.monotonic()
+        with SessionLocal() as db:
+            rows = db.exec(
+                select(Produkt.id, Produkt.nazwa, Produkt.kategoria)
+                .where(Produkt.id > self._last_id, Produkt.paragon_id.is_(None))
+                .order_by(Produkt.id)
+            ).all()
+        for produkt_id, nazwa, kategoria in rows:
+            self._add(produkt_id, nazwa, kategoria)
+            self._last_id = max(self._last_id, produkt_id)
+
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            posting = self._postings[gram]
+            array = self._posting_arrays[gram] = np.fromiter(posting, dtype=np.int64, count=len(posting))
+        return array
+
+    def _candidates(self, normalized: str) -> np.ndarray:
+        """Ids of the names sharing the most trigrams with the query, counted with one bincount"""
+        if len(self._products) <= MAX_CANDIDATES:
+            return np.fromiter(self._products, dtype=np.int64, count=len(self._products))
+        postings = [self._posting_array(gram) for gram in trigrams(normalized) if gram in self._postings]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        overlap = np.bincount(np.concatenate(postings))
+        hits = np.flatnonzero(overlap)
+        if len(hits) > MAX_CANDIDATES:
+            hits = hits[np.argpartition(overlap[hits], -MAX_CANDIDATES)[-MAX_CANDIDATES:]]
+        return hits
+
+    def _suggestion(self, produkt_id: int, score: float) -> Dict[str, object]:
+        nazwa, kategoria, _ = self._products[produkt_id]
+        return {"id": produkt_id, "nazwa": nazwa, "kategoria": kategoria, "podobienstwo": round(score)}
+
+    def search(self, name: str, limit: int = 3, score_cutoff: float = 0) -> List[Dict[str, object]]:
+        """Best matching pantry products as suggestion dicts (id, nazwa, kategoria, podobienstwo)"""
+        if self.embeddings is not None:
+            return self.search_many([name], limit=limit, score_cutoff=score_cutoff)[0]
+        normalized = normalize_name(name)
+        with self._lock:
+            self._refresh()
+            candidates = {produkt_id: self._products[produkt_id][2] for produkt_id in self._candidates(normalized).tolist()}
+            matches = process.extract(
+                normalized, candidates, scorer=fuzz.WRatio, processor=None,
+                limit=limit, score_cutoff=score_cutoff
+            )
+            return [self._suggestion(produkt_id, score) for _, score, produkt_id in matches]
+
+    def search_many(self, names: List[str], limit: int = 3, score_cutoff: float = 0) -> List[List[Dict[str, object]]]:
+        """
+        Suggestions for many names at once
+
+        Candidates of every name are gathered first and all (name, candidate) pairs are
+        scored in one vectorized cpdist call, which runs on all cores and without a Python
+        round trip per pair. Against a pantry of at most MAX_CANDIDATES names the pairs
+        form the full names x pantry matrix.
+        """
+        if not names:
+            return []
+        normalized = [normalize_name(name) for name in names]
+        with self._lock:
+            self._refresh()
+            pending = self.embeddings.pending() if self.embeddings is not None else None
+        embedded = self._embed(normalized, pending) if pending is not None else None
+        with self._lock:
+            candidates = [self._candidates(query) for query in normalized]
+            semantic = None
+            if embedded is not None:
+                queries, pending_vectors = embedded
+                self.embeddings.index(pending, pending_vectors)
+                semantic = (queries, self.embeddings.knn(queries, SEMANTIC_CANDIDATES))
+                candidates = [np.union1d(ids, neighbours) for ids, neighbours in zip(candidates, semantic[1])]
+            candidate_ids = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+            if not len(candidate_ids):
+                return [[] for _ in names]
+            scores = process.cpdist(
+                [query for query, ids in zip(normalized, candidates) for _ in range(len(ids))],
+                [self._products[produkt_id][2] for produkt_id in candidate_ids.tolist()],
+                scorer=fuzz.WRatio, processor=None, score_cutoff=score_cutoff if semantic is None else 0,
+                dtype=np.float32, workers=-1
+            )
+            results, offset = [], 0
+            for row, ids in enumerate(candidates):
+                row_ids, row_scores = candidate_ids[offset:offset + len(ids)], scores[offset:offset + len(ids)]
+                offset += len(ids)
+                if semantic is not None:
+                    similarity = self.embeddings.similarity(semantic[0][row], row_ids)
+                    blended = (1 - self.semantic_weight) * row_scores + self.semantic_weight * 100 * np.clip(similarity, 0, 1)
+                    row_scores = np.where(np.isnan(similarity), row_scores, blended)
+                best = np.argsort(-row_scores, kind="stable")[:limit]
+                results.append([
+                    self._suggestion(int(row_ids[column]), float(row_scores[column]))
+                    for column in best
+                    if row_scores[column] > 0 and row_scores[column] >= score_cutoff
+                ])
+            return results
+
+    def _embed(self, normalized: List[str], pending: Dict[int, str]) -> Optional[Tuple[np.ndarray, Dict[int, np.ndarray]]]:
+        """Query and pending product embeddings, or None to fall back to fuzzy matching alone
+
+        Called without the lock: it may wait on the model server.
+        """
+        try:
+            return self.embeddings.compute(normalized, pending)
+        except EmbeddingError as e:
+            logger.warning(f"Semantic product matching unavailable: {str(e)}")
+            return None
+
+    def apply_changes(self, upserts: List[Tuple[int, str, str]], removals: List[int]) -> None:
+        """Apply committed pantry changes without reloading"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for produkt_id in removals:
+                self._remove(produkt_id)
+            for produkt_id, nazwa, kategoria in upserts:
+                self._add(produkt_id, nazwa, kategoria)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+@lru_cache()
+def get_pantry_index() -> PantryIndex:
+    """Get the process-wide pantry index"""
+    settings = get_settings()
+    return PantryIndex(
+        settings.PANTRY_INDEX_MAX_AGE_S,
+        create_pantry_embeddings(settings),
+        settings.PRODUCT_EMBEDDINGS_WEIGHT
+    )
+
+# Incremental invalidation: collect flushed Produkt changes per session, apply them on commit
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_pantry_changes(session, flush_context):
+    changes = session.info.setdefault("pantry_changes", {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Produkt) and obj.id is not None:
+            changes[obj.id] = (obj.nazwa, obj.kategoria) if obj.paragon_id is None else None
+    for obj in session.deleted:
+        if isinstance(obj, Produkt) and obj.id is not None:
+            changes[obj.id] = None
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_pantry_changes(session):
+    changes = session.info.pop("pantry_changes", None)
+    if not changes:
+        return
+    try:
+        get_pantry_index().apply_changes(
+            [(produkt_id, *entry) for produkt_id, entry in changes.items() if entry is not None],
+            [produkt_id for produkt_id, entry in changes.items() if entry is None]
+        )
+    except Exception as e:
+        # The index is rebuilt after max_age anyway; never fail a commit over it
+        logger.warning(f"Could not update pantry index: {str(e)}")
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_pantry_changes(session):
+    session.info.pop("pantry_changes", None)
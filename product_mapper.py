@@ -1,59 +1,78 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
 import json
-from thefuzz import process
-from sqlmodel import Session, select
-from models import Produkt, StatusMapowania, LogBledow, PoziomLogu
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select, func
+from models import Produkt, Paragon, AliasProduktu, LicznikMapowania, StatusMapowania, LogBledow, PoziomLogu
 from db_logger import log_to_db
 from database import SessionLocal
+from product_index import get_pantry_index, normalize_name
+from config import get_settings
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
+# LicznikMapowania keys: receipt lines mapped, lines resolved by alias, lines mapped without review
+MAPPING_COUNTERS = ("pozycje", "trafienia_aliasow", "automapowania")
 
 class ProductMapper:
     def __init__(self, session=None):
         self.session = session or SessionLocal()
         self.fuzzy_threshold = 80  # Minimum similarity score to consider a match
+        # Aliases confirmed this many times map receipt lines without review (0 disables)
+        self.auto_map_confirmations = get_settings().PRODUCT_ALIAS_AUTO_MAP_CONFIRMATIONS
 
-    def find_suggestions(self, product_name: str, limit: int = 3) -> List[Dict[str, Any]]:
-        """Find similar products in the pantry using fuzzy matching"""
-        # Get all products from pantry (those without paragon_id)
-        pantry_products = self.session.exec(
-            select(Produkt).where(Produkt.paragon_id.is_(None))
+    def _store_key(self, paragon_id: Optional[int]) -> str:
+        """Normalized store name of a receipt, empty when unknown"""
+        paragon = self.session.get(Paragon, paragon_id) if paragon_id is not None else None
+        return normalize_name(paragon.sklep) if paragon is not None and paragon.sklep else ""
+
+    def resolve_aliases(self, normalized_names: List[str], sklep: str = "") -> Dict[str, Tuple[AliasProduktu, Produkt]]:
+        """Confirmed aliases for normalized receipt names, preferring the store's own over store-less ones"""
+        if not normalized_names:
+            return {}
+        rows = self.session.exec(
+            select(AliasProduktu, Produkt)
+            .join(Produkt, Produkt.id == AliasProduktu.produkt_id)
+            .where(AliasProduktu.nazwa.in_(set(normalized_names)), AliasProduktu.sklep.in_({sklep, ""}))
         ).all()
-        
-        # Get product names for fuzzy matching
-        product_names = [p.nazwa for p in pantry_products]
-        
-        # Find matches using fuzzy matching
-        matches = process.extract(
-            product_name,
-            product_names,
-            limit=limit,
-            score_cutoff=self.fuzzy_threshold
-        )
-        
-        # Convert matches to product objects with similarity scores
-        suggestions = []
-        for name, score in matches:
-            product = next(p for p in pantry_products if p.nazwa == name)
-            suggestions.append({
-                "id": product.id,
-                "nazwa": product.nazwa,
-                "kategoria": product.kategoria,
-                "podobienstwo": score
-            })
-        
-        return suggestions
+        aliases = {}
+        for alias, produkt in sorted(rows, key=lambda row: row[0].sklep != ""):
+            aliases.setdefault(alias.nazwa, (alias, produkt))
+        return aliases
+
+    def _record_alias(self, receipt_product: Produkt, pantry_product_id: int) -> None:
+        """Remember a confirmed receipt name -> pantry product mapping for the receipt's store"""
+        nazwa, sklep = normalize_name(receipt_product.nazwa), self._store_key(receipt_product.paragon_id)
+        alias = self.session.exec(
+            select(AliasProduktu).where(AliasProduktu.nazwa == nazwa, AliasProduktu.sklep == sklep)
+        ).first()
+        if alias is None:
+            alias = AliasProduktu(nazwa=nazwa, sklep=sklep, produkt_id=pantry_product_id)
+        elif alias.produkt_id == pantry_product_id:
+            alias.liczba_potwierdzen += 1
+        else:
+            alias.produkt_id = pantry_product_id
+            alias.liczba_potwierdzen = 1
+        alias.data_aktualizacji = datetime.utcnow()
+        self.session.add(alias)
+
+    def _forget_alias(self, receipt_product: Produkt) -> None:
+        """Drop the alias of a receipt name the user unmapped"""
+        alias = self.session.exec(
+            select(AliasProduktu).where(
+                AliasProduktu.nazwa == normalize_name(receipt_product.nazwa),
+                AliasProduktu.sklep == self._store_key(receipt_product.paragon_id)
+            )
+        ).first()
+        if alias is not None:
+            self.session.delete(alias)
+
+    def find_suggestions(self, product_name: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Find similar products in the pantry using the in-memory fuzzy-match index"""
+        return get_pantry_index().search(product_name, limit=limit, score_cutoff=self.fuzzy_threshold)
+
+    def find_suggestions_batch(self, product_names: List[str], limit: int = 3) -> List[List[Dict[str, Any]]]:
+        """Find similar pantry products for many names in one vectorized scoring pass"""
+        return get_pantry_index().search_many(product_names, limit=limit, score_cutoff=self.fuzzy_threshold)
 
     def update_product_mapping(self, receipt_product_id: int, pantry_product_id: Optional[int] = None) -> None:
         """Update product mapping status and relationship"""
@@ -68,9 +87,13 @@ class ProductMapper:
                 
             receipt_product.zmapowany_do_id = pantry_product_id
             receipt_product.status_mapowania = StatusMapowania.ZMAPOWANY
+            if receipt_product.paragon_id is not None:
+                self._record_alias(receipt_product, pantry_product_id)
         else:
             receipt_product.zmapowany_do_id = None
             receipt_product.status_mapowania = StatusMapowania.NOWY
+            if receipt_product.paragon_id is not None:
+                self._forget_alias(receipt_product)
             
         self.session.add(receipt_product)
         self.session.commit()
@@ -100,11 +123,58 @@ class ProductMapper:
                 })
             )
             
-            for product in receipt_products:
-                suggestions = self.find_suggestions(product.nazwa)
-                product.sugestie_mapowania = json.dumps(suggestions)
-                self.session.add(product)
-            
+            # Known names resolve by exact lookup; only the rest is fuzzy-scored
+            normalized = [normalize_name(product.nazwa) for product in receipt_products]
+            sklep = self._store_key(receipt_products[0].paragon_id) if receipt_products else ""
+            aliases = self.resolve_aliases(normalized, sklep)
+            misses = [product for product, nazwa in zip(receipt_products, normalized) if nazwa not in aliases]
+            fuzzy = dict(zip((product.id for product in misses), self.find_suggestions_batch([product.nazwa for product in misses])))
+
+            values, alias_uses = [], {}
+            for product, nazwa in zip(receipt_products, normalized):
+                if product.id in fuzzy:
+                    values.append({"id": product.id, "sugestie_mapowania": json.dumps(fuzzy[product.id])})
+                    continue
+                alias, produkt = aliases[nazwa]
+                alias_uses[alias.id] = alias_uses.get(alias.id, 0) + 1
+                row = {
+                    "id": product.id,
+                    "sugestie_mapowania": json.dumps([{
+                        "id": produkt.id,
+                        "nazwa": produkt.nazwa,
+                        "kategoria": produkt.kategoria.value,
+                        "podobienstwo": 100,
+                        "alias": True
+                    }])
+                }
+                if self.auto_map_confirmations and alias.liczba_potwierdzen >= self.auto_map_confirmations:
+                    row.update(zmapowany_do_id=produkt.id, status_mapowania=StatusMapowania.ZMAPOWANY)
+                values.append(row)
+            auto_mapped = sum("zmapowany_do_id" in row for row in values)
+
+            if values:
+                # One executemany UPDATE by primary key instead of a flush per product
+                self.session.execute(update(Produkt), values)
+                for product, row in zip(receipt_products, values):
+                    for key, value in row.items():
+                        if key != "id":
+                            set_committed_value(product, key, value)
+                if alias_uses:
+                    self.session.execute(
+                        update(AliasProduktu.__table__)
+                        .where(AliasProduktu.__table__.c.id == bindparam("alias_id"))
+                        .values(liczba_uzyc=AliasProduktu.__table__.c.liczba_uzyc + bindparam("uses")),
+                        [{"alias_id": alias_id, "uses": uses} for alias_id, uses in alias_uses.items()]
+                    )
+                self.session.execute(
+                    update(LicznikMapowania.__table__)
+                    .where(LicznikMapowania.__table__.c.klucz == bindparam("counter"))
+                    .values(liczba=LicznikMapowania.__table__.c.liczba + bindparam("delta")),
+                    [
+                        {"counter": counter, "delta": delta}
+                        for counter, delta in zip(MAPPING_COUNTERS, (len(values), len(values) - len(misses), auto_mapped))
+                    ]
+                )
             self.session.commit()
             
             log_to_db(
@@ -114,6 +184,8 @@ class ProductMapper:
                 "Mapowanie produktów zakończone pomyślnie",
                 json.dumps({
                     "products_count": len(receipt_products),
+                    "alias_hits": len(receipt_products) - len(misses),
+                    "auto_mapped": auto_mapped,
                     "status": "completed"
                 })
             )
@@ -131,4 +203,16 @@ class ProductMapper:
                     "traceback": str(e.__traceback__)
                 })
             )
-            raise 
\ No newline at end of file
+            raise
+
+def get_mapping_stats(session: Session) -> Dict[str, Any]:
+    """Alias hit rate and auto-mapping counts of receipt lines mapped so far"""
+    counters = dict(session.exec(select(LicznikMapowania.klucz, LicznikMapowania.liczba)).all())
+    lines, hits, auto_mapped = (counters.get(counter, 0) for counter in MAPPING_COUNTERS)
+    return {
+        "lines": lines,
+        "alias_hits": hits,
+        "auto_mapped": auto_mapped,
+        "hit_ratio": round(hits / lines, 3) if lines else 0.0,
+        "aliases": session.exec(select(func.count()).select_from(AliasProduktu)).one()
+    }
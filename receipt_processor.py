@@ -1,8 +1,9 @@
 import multiprocessing
 multiprocessing.set_start_method('spawn', force=True)
 
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable, BinaryIO
 from PIL import Image, ImageFile, UnidentifiedImageError
 import io
 import magic
@@ -12,8 +13,8 @@ import requests
 import logging
 logger = logging.getLogger(__name__)
 from config import get_settings
-from models import StatusParagonu, LogBledow, PoziomLogu
-from ollama_client import OllamaError, OllamaTimeoutError, OllamaConnectionError, ollama_generate
+from models import Paragon, StatusParagonu, LogBledow, LicznikOCR, PoziomLogu
+from ollama_client import OllamaError, OllamaTimeoutError, OllamaConnectionError, ollama_generate, ollama_generate_stream
 from pydantic import BaseModel, Field, ValidationError, ConfigDict
 from datetime import date
 import uuid
@@ -23,9 +24,18 @@ import json
 import os
 from db_logger import log_to_db
 from database import SessionLocal
+from result_cache import get_result_cache, hash_file, make_key
+from image_preprocessing import preprocess_for_ocr, parse_steps
+from sqlalchemy import update
+from sqlmodel import Session, select
 import pytesseract
 import re
 import time
+import asyncio
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
 
 # Set environment variables for CUDA
 os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Disable CUDA
@@ -36,6 +46,38 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 settings = get_settings()
 
+# LogBledow messages recording whether the PDF text layer fast path was used
+PDF_TEXT_LAYER_HIT = "Użyto warstwy tekstowej PDF"
+PDF_TEXT_LAYER_MISS = "Brak warstwy tekstowej PDF, wymagany OCR"
+# LicznikOCR keys: PDFs read from their text layer, PDFs that needed OCR
+PDF_TEXT_LAYER_COUNTERS = ("pdf_warstwa_tekstowa", "pdf_ocr")
+# Minimum time between two progress writes while LLM items stream in
+ITEM_PROGRESS_INTERVAL_S = 0.5
+
+def _count_pdf_text_layer(hit: bool) -> None:
+    """Add one to the text layer hit or miss counter; statistics never fail a receipt"""
+    try:
+        with SessionLocal() as db:
+            db.execute(
+                update(LicznikOCR)
+                .where(LicznikOCR.klucz == PDF_TEXT_LAYER_COUNTERS[0 if hit else 1])
+                .values(liczba=LicznikOCR.liczba + 1)
+            )
+            db.commit()
+    except Exception as e:
+        logger.warning(f"Could not update PDF text layer counter: {str(e)}")
+
+def get_pdf_text_layer_stats(session: Session) -> Dict[str, Any]:
+    """How often PDF receipts were read from their text layer instead of OCR"""
+    counters = dict(session.exec(select(LicznikOCR.klucz, LicznikOCR.liczba)).all())
+    hits, misses = (counters.get(counter, 0) for counter in PDF_TEXT_LAYER_COUNTERS)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 3) if total else 0.0
+    }
+
 class ReceiptItem(BaseModel):
     """Model for a single item in a receipt"""
     model_config = ConfigDict(extra='forbid')
@@ -75,18 +117,214 @@ class Receipt(BaseModel):
         if not self.items:
             raise ValueError("At least one item is required")
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
+class OCRBackend(ABC):
+    """Base class for OCR engines used by ReceiptProcessor"""
+    name = "base"
+
+    @abstractmethod
+    def image_to_string(self, image: Image.Image) -> str:
+        """Recognise the text of one image; may be called from several threads at once"""
+
+    def close(self) -> None:
+        pass
+
+class PytesseractBackend(OCRBackend):
+    """Spawns a tesseract process per image, reloading traineddata each time"""
+    name = "pytesseract"
+
+    def __init__(self, lang: str):
+        self.lang = lang
+
+    def image_to_string(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+class TesserocrBackend(OCRBackend):
+    """Pool of long-lived TessBaseAPI instances with traineddata loaded once per process"""
+    name = "tesserocr"
+
+    def __init__(self, lang: str, pool_size: int):
+        import tesserocr
+        self._apis = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            self._apis.put(tesserocr.PyTessBaseAPI(lang=lang))
+
+    def image_to_string(self, image: Image.Image) -> str:
+        # Each API instance is used by one thread at a time; tesserocr releases the GIL
+        api = self._apis.get()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._apis.put(api)
+
+    def close(self) -> None:
+        while not self._apis.empty():
+            self._apis.get_nowait().End()
+
+_ocr_backend: Optional[OCRBackend] = None
+_ocr_backend_lock = threading.Lock()
+
+def init_ocr_backend() -> OCRBackend:
+    """Create the process-wide OCR backend, called from Celery's worker_process_init
+
+    PDF pages are OCR'd from several threads, so the first use may come from more than
+    one at once; the lock makes sure only one engine pool is created.
+    """
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is not None:
+            return _ocr_backend
+
+        backend = settings.OCR_BACKEND.lower()
+        ocr_backend: Optional[OCRBackend] = None
+        if backend in ("auto", "tesserocr"):
+            try:
+                ocr_backend = TesserocrBackend(settings.OCR_LANG, settings.OCR_ENGINE_POOL_SIZE)
+            except Exception as e:
+                if backend == "tesserocr":
+                    logger.error(f"Failed to initialize tesserocr backend: {str(e)}", exc_info=True)
+                logger.warning(f"tesserocr unavailable ({str(e)}), falling back to pytesseract")
+        if ocr_backend is None:
+            ocr_backend = PytesseractBackend(settings.OCR_LANG)
+
+        _ocr_backend = ocr_backend
+        logger.info(f"OCR backend initialized: {_ocr_backend.name}")
+        return _ocr_backend
+
+def get_ocr_backend() -> OCRBackend:
+    """Get the process-wide OCR backend, creating it on first use"""
+    backend = _ocr_backend
+    return backend if backend is not None else init_ocr_backend()
+
+def shutdown_ocr_backend() -> None:
+    """Release the OCR engines of this process"""
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is not None:
+            _ocr_backend.close()
+            _ocr_backend = None
+
+class StreamingCartParser:
+    """Incremental parser for the parse_cart tool_call JSON streamed by the LLM
+    
+    Tracks nesting outside of string literals, emits every object closed inside
+    the "items" array and records the text of the first complete top-level object.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.items: List[Dict[str, Any]] = []
+        self.json_text: Optional[str] = None
+        self._pos = 0
+        self._stack = []  # (opening char, key it belongs to, start index)
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._pending_key = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether the top-level JSON object has been closed"""
+        return self.json_text is not None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a text fragment and return items completed by it"""
+        if self.complete:
+            return []
+
+        self.text += chunk
+        text = self.text
+        new_items = []
+        while self._pos < len(text):
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+
+            # Skip any chatter before the object starts
+            if not self._stack and ch != '{':
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ':':
+                self._pending_key = self._last_string
+            elif ch == ',':
+                self._pending_key = None
+            elif ch in '{[':
+                self._stack.append((ch, self._pending_key, i))
+                self._pending_key = None
+            elif ch in '}]':
+                opener, _, start = self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if opener == '{' and parent and parent[0] == '[' and parent[1] == 'items':
+                    item = self._load_item(text[start:i + 1])
+                    if item is not None:
+                        new_items.append(item)
+                if not self._stack:
+                    self.json_text = text[start:i + 1]
+                    break
+
+        self.items.extend(new_items)
+        return new_items
+
+    def _load_item(self, item_text: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(re.sub(r',\s*([}\]])', r'\1', item_text))
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping unparsable streamed item: {item_text[:200]}")
+            return None
+
+class ItemProgressPublisher:
+    """Publishes streamed items to a receipt's progress fields without blocking the event loop
+
+    Writes run in a worker thread, at most one at a time and one per
+    ITEM_PROGRESS_INTERVAL_S; items arriving in between only replace the pending
+    state, which the next write or close() publishes.
+    """
+
+    def __init__(self, publish: Callable[[Optional[int], Dict[str, Any], int], None], paragon_id: Optional[int]):
+        self.publish = publish
+        self.paragon_id = paragon_id
+        self._pending: Optional[Tuple[Dict[str, Any], int]] = None
+        self._last_write = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def item(self, item: Dict[str, Any], count: int) -> None:
+        """Record a recognised item; called from the stream callback on the event loop"""
+        if self.paragon_id is None:
+            return
+        self._pending = (item, count)
+        if (self._task is None or self._task.done()) and time.monotonic() - self._last_write >= ITEM_PROGRESS_INTERVAL_S:
+            self._start()
+
+    def _start(self) -> None:
+        item, count = self._pending
+        self._pending = None
+        self._last_write = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(self.publish, self.paragon_id, item, count)
         )
-        db.add(log)
-        db.commit()
+
+    async def close(self, publish_pending: bool = True) -> None:
+        """Wait for the write in flight, then publish the last item unless the stream failed"""
+        if self._task is not None:
+            await self._task
+        if publish_pending and self._pending is not None:
+            self._start()
+            await self._task
 
 class ReceiptProcessor:
     def __init__(self):
@@ -105,6 +343,37 @@ class ReceiptProcessor:
             'application/pdf': '.pdf'  # Add PDF support
         }
         self.max_file_size = settings.MAX_CONTENT_LENGTH
+        self.preprocessing_steps = parse_steps(settings.OCR_PREPROCESSING)
+        
+        self.cache = get_result_cache() if settings.RESULT_CACHE_ENABLED else None
+        if self.cache:
+            # Drop extraction results produced by another model or prompt
+            self.cache.ensure_fingerprint("llm", {
+                "model": settings.OLLAMA_MODEL,
+                "prompt_version": self.prompt_version
+            })
+        self._ocr_fingerprint_checked = False
+
+    def _ensure_ocr_fingerprint(self) -> None:
+        """Drop OCR text read with another engine, language, preprocessing pipeline or PDF DPI
+
+        Checked on first use rather than in __init__: with OCR_BACKEND=auto the engine is
+        only known once the backend is initialized, which must happen in the worker process.
+        """
+        if self._ocr_fingerprint_checked:
+            return
+        self.cache.ensure_fingerprint("ocr", {
+            "backend": get_ocr_backend().name,
+            "lang": settings.OCR_LANG,
+            "preprocessing": settings.OCR_PREPROCESSING,
+            "pdf_dpi": str(settings.PDF_DPI)
+        })
+        self._ocr_fingerprint_checked = True
+
+    @property
+    def prompt_version(self) -> str:
+        """Short hash of the extraction prompt template"""
+        return make_key(self._get_receipt_prompt_for_text_input(""))[:12]
 
     async def validate_file(self, file: UploadFile) -> None:
         """Validate uploaded file"""
@@ -142,12 +411,38 @@ class ReceiptProcessor:
         
         return str(file_path)
 
+    def _write_atomically(self, file_path: Path, write: Callable[[BinaryIO], None]) -> None:
+        """Write a file through temp file + fsync + rename so workers never see partial content"""
+        tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        
+        # Persist the rename itself (not supported on Windows)
+        try:
+            dir_fd = os.open(file_path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
     async def save_file(self, file: UploadFile, upload_dir: Path) -> Path:
-        """Save uploaded file and return path"""
+        """Save uploaded file atomically and return its absolute path"""
         try:
             # Create upload directory if it doesn't exist
+            upload_dir = upload_dir.resolve()
             upload_dir.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Upload directory: {upload_dir.absolute()}")
+            logger.info(f"Upload directory: {upload_dir}")
             
             # Read file content once
             content = await file.read()
@@ -164,8 +459,7 @@ class ReceiptProcessor:
             try:
                 if mime_type == 'application/pdf':
                     # Save PDF file first
-                    with open(file_path, 'wb') as f:
-                        f.write(content)
+                    self._write_atomically(file_path, lambda f: f.write(content))
                     
                     # Convert first page of PDF to image
                     with tempfile.TemporaryDirectory() as temp_dir:
@@ -173,22 +467,16 @@ class ReceiptProcessor:
                             file_path,
                             first_page=1,
                             last_page=1,
-                            dpi=300,
+                            dpi=settings.PDF_DPI,
                             output_folder=temp_dir
                         )
                         if images:
                             # Save first page as PNG
                             image_path = file_path.with_suffix('.png')
-                            images[0].save(image_path, 'PNG')
-                            # Verify file was saved
-                            if not image_path.exists():
-                                raise HTTPException(
-                                    status_code=500,
-                                    detail=f"Failed to save converted image: {image_path}"
-                                )
+                            self._write_atomically(image_path, lambda f: images[0].save(f, 'PNG'))
                             # Log file info
                             file_size = image_path.stat().st_size
-                            logger.info(f"PDF converted and saved as image: {image_path.absolute()}, size: {file_size} bytes")
+                            logger.info(f"PDF converted and saved as image: {image_path}, size: {file_size} bytes")
                             return image_path
                         else:
                             raise HTTPException(
@@ -197,31 +485,23 @@ class ReceiptProcessor:
                             )
                 else:
                     # Handle regular image files
+                    img = Image.open(io.BytesIO(content))
                     if mime_type == 'image/png':
                         # For PNG, preserve transparency
-                        img = Image.open(io.BytesIO(content))
-                        img.save(file_path, "PNG")
+                        self._write_atomically(file_path, lambda f: img.save(f, "PNG"))
                     else:
                         # For other formats, convert to RGB and save as JPEG
-                        img = Image.open(io.BytesIO(content))
                         if img.mode in ('RGBA', 'LA'):
                             background = Image.new('RGB', img.size, (255, 255, 255))
                             background.paste(img, mask=img.split()[-1])
                             img = background
                         elif img.mode != 'RGB':
                             img = img.convert('RGB')
-                        img.save(file_path, "JPEG", quality=95)
-                    
-                    # Verify file was saved
-                    if not file_path.exists():
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Failed to save file: {file_path}"
-                        )
+                        self._write_atomically(file_path, lambda f: img.save(f, "JPEG", quality=95))
                     
                     # Log file info
                     file_size = file_path.stat().st_size
-                    logger.info(f"File saved successfully: {file_path.absolute()}, size: {file_size} bytes")
+                    logger.info(f"File saved successfully: {file_path}, size: {file_size} bytes")
                     
                     return file_path
                 
@@ -241,85 +521,61 @@ class ReceiptProcessor:
                 detail="Error saving file"
             )
 
-    def _extract_text_with_retry(self, image_path: Path) -> str:
-        """Extract text with retry mechanism for file access"""
-        if not image_path.exists():
-            # Try different possible paths
-            possible_paths = [
-                image_path,
-                Path.cwd() / image_path,
-                Path(f"./{image_path}"),
-                Path(f"../{image_path}")
-            ]
-            
-            for path in possible_paths:
-                if path.exists():
-                    logger.info(f"Found file at: {path.absolute()}")
-                    image_path = path
-                    break
-            else:
-                raise FileNotFoundError(f"Could not find file: {image_path}")
-        
-        return pytesseract.image_to_string(Image.open(str(image_path)), lang='pol')
-
-    def monitor_file_access(self, file_path: Path) -> bool:
-        """Monitor if file is accessible"""
-        max_wait = 10  # 10 seconds
-        wait_interval = 0.5
-        
-        for _ in range(int(max_wait / wait_interval)):
-            if file_path.exists() and file_path.stat().st_size > 0:
-                return True
-            time.sleep(wait_interval)
-        
-        return False
+    def _ocr_image(self, image_path: Path) -> str:
+        """Preprocess an image and run OCR on it"""
+        with Image.open(str(image_path)) as image:
+            image, timings = preprocess_for_ocr(
+                image,
+                self.preprocessing_steps,
+                target_width=settings.OCR_TARGET_WIDTH,
+                max_skew=settings.OCR_MAX_SKEW
+            )
+            if timings:
+                logger.info(f"OCR preprocessing for {image_path}: {timings}")
+                log_to_db(
+                    PoziomLogu.INFO,
+                    "receipt_processor",
+                    "_ocr_image",
+                    f"Przetwarzanie wstępne obrazu zakończone: {image_path}",
+                    json.dumps({
+                        "file_path": str(image_path),
+                        "stage": "preprocessing",
+                        "steps_ms": timings,
+                        "total_ms": round(sum(timings.values()), 2),
+                        "output_size": list(image.size)
+                    })
+                )
+            return get_ocr_backend().image_to_string(image)
 
     def _extract_text_from_image(self, image_path: Path) -> str:
-        """Extract text from image using pytesseract"""
+        """Extract text from image using the configured OCR backend
+        
+        Uploads are renamed into place only once fully written and their absolute
+        path is stored, so the file is opened directly without waiting or probing.
+        """
         try:
-            # Check if file exists
-            if not image_path.exists():
+            try:
+                file_size = image_path.stat().st_size
+            except FileNotFoundError:
                 logger.error(f"Image file not found: {image_path}")
-                # Try with full path
-                full_path = Path.cwd() / image_path
-                if full_path.exists():
-                    image_path = full_path
-                    logger.info(f"Found file at full path: {full_path}")
-                else:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Image file not found: {image_path}"
-                    )
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Image file not found: {image_path}"
+                )
             
             # Check file size
-            if image_path.stat().st_size == 0:
+            if file_size == 0:
                 logger.error(f"Image file is empty: {image_path}")
                 raise HTTPException(
                     status_code=400,
                     detail=f"Image file is empty: {image_path}"
                 )
             
-            # Monitor file access
-            if not self.monitor_file_access(image_path):
-                raise HTTPException(
-                    status_code=503,
-                    detail=f"File not accessible after waiting: {image_path}"
-                )
-            
             logger.info(f"Starting OCR for image: {image_path}")
-            # Add retry mechanism for OCR
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    text = self._extract_text_with_retry(image_path)
-                    logger.info(f"OCR completed successfully for {image_path}")
-                    logger.debug(f"Extracted text length: {len(text)}")
-                    return text
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise
-                    logger.warning(f"OCR attempt {attempt + 1} failed: {e}")
-                    time.sleep(1)  # Short pause before retry
+            text = self._ocr_image(image_path)
+            logger.info(f"OCR completed successfully for {image_path}")
+            logger.debug(f"Extracted text length: {len(text)}")
+            return text
             
         except HTTPException:
             raise
@@ -330,13 +586,153 @@ class ReceiptProcessor:
                 detail=f"Error during OCR processing: {str(e)}"
             )
 
+    def _source_pdf(self, image_path: Path) -> Optional[Path]:
+        """Get the original PDF an uploaded page image was rendered from"""
+        if image_path.suffix.lower() == '.pdf':
+            return image_path if image_path.exists() else None
+        pdf_path = image_path.with_suffix('.pdf')
+        return pdf_path if pdf_path.exists() else None
+
+    def _extract_pdf_text_layer(self, pdf_path: Path) -> Optional[str]:
+        """Get the embedded text layer of a PDF with pdftotext, or None for scanned PDFs"""
+        started = time.perf_counter()
+        try:
+            result = subprocess.run(
+                ["pdftotext", "-layout", "-enc", "UTF-8", str(pdf_path), "-"],
+                capture_output=True,
+                timeout=30,
+                check=True
+            )
+            text = result.stdout.decode("utf-8", errors="replace")
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"pdftotext failed for {pdf_path}: {str(e)}")
+            text = ""
+        
+        # Scanned PDFs have no text layer, or only a few stray characters
+        hit = len("".join(text.split())) >= settings.PDF_TEXT_LAYER_MIN_CHARS
+        log_to_db(
+            PoziomLogu.INFO,
+            "receipt_processor",
+            "_extract_pdf_text_layer",
+            PDF_TEXT_LAYER_HIT if hit else PDF_TEXT_LAYER_MISS,
+            json.dumps({
+                "file_path": str(pdf_path),
+                "stage": "text_extraction",
+                "text_layer_hit": hit,
+                "chars": len(text),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+        )
+        _count_pdf_text_layer(hit)
+        return text if hit else None
+
+    def _ocr_pdf_page(self, pdf_path: Path, page: int) -> Tuple[str, Dict[str, Any]]:
+        """Rasterize and OCR a single PDF page, returning its text and timings"""
+        started = time.perf_counter()
+        images = pdf2image.convert_from_path(
+            str(pdf_path),
+            dpi=settings.PDF_DPI,
+            first_page=page,
+            last_page=page
+        )
+        rasterized = time.perf_counter()
+        text = get_ocr_backend().image_to_string(images[0]) if images else ""
+        finished = time.perf_counter()
+        return text, {
+            "page": page,
+            "rasterize_ms": round((rasterized - started) * 1000, 1),
+            "ocr_ms": round((finished - rasterized) * 1000, 1),
+            "chars": len(text)
+        }
+
+    def _extract_text_from_pdf(self, pdf_path: Path) -> str:
+        """OCR all pages of a PDF concurrently and merge their text in page order
+        
+        Pages are fanned out to threads: pdftoppm and tesseract run as external
+        processes, so this scales with cores without a process pool (Celery's
+        prefork children are daemonic and cannot start one).
+        """
+        try:
+            page_count = pdf2image.pdfinfo_from_path(str(pdf_path))["Pages"]
+        except Exception as e:
+            logger.error(f"Could not read PDF info for {pdf_path}: {str(e)}", exc_info=True)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Could not read PDF: {str(e)}"
+            )
+        
+        workers = max(1, min(settings.OCR_WORKERS, page_count))
+        logger.info(f"Starting OCR for {page_count} PDF pages with {workers} workers: {pdf_path}")
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda page: self._ocr_pdf_page(pdf_path, page),
+                    range(1, page_count + 1)
+                ))
+        except Exception as e:
+            logger.error(f"Error during OCR for PDF {pdf_path}: {str(e)}", exc_info=True)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error during OCR processing: {str(e)}"
+            )
+        
+        timings = [page_timings for _, page_timings in results]
+        log_to_db(
+            PoziomLogu.INFO,
+            "receipt_processor",
+            "_extract_text_from_pdf",
+            f"OCR {page_count} stron PDF zakończony: {pdf_path}",
+            json.dumps({
+                "file_path": str(pdf_path),
+                "stage": "text_extraction",
+                "pages": timings,
+                "workers": workers,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+        )
+        return "\n".join(text for text, _ in results)
+
+    def _extract_text_cached(self, image_path: Path) -> str:
+        """Extract text from the receipt, reusing OCR output for identical file content"""
+        source_pdf = self._source_pdf(image_path)
+        source_path = source_pdf or image_path
+        
+        def extract() -> str:
+            if source_pdf:
+                # Fast path: PDFs from online shops usually carry a text layer
+                text = self._extract_pdf_text_layer(source_pdf)
+                if text is not None:
+                    return text
+                return self._extract_text_from_pdf(source_pdf)
+            return self._extract_text_from_image(image_path)
+        
+        if not self.cache or not source_path.exists():
+            return extract()
+        
+        self._ensure_ocr_fingerprint()
+        source_hash = hash_file(source_path)
+        cached_text = self.cache.get("ocr", source_hash)
+        if cached_text is not None:
+            logger.info(f"OCR result cache hit for: {source_path}")
+            return cached_text
+        
+        text = extract()
+        if text.strip():
+            self.cache.set("ocr", source_hash, text)
+        return text
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
         reraise=True
     )
-    async def process_receipt(self, image_path: Path) -> Dict[str, Any]:
-        """Process receipt using OCR and Ollama API"""
+    async def process_receipt(self, image_path: Path, paragon_id: Optional[int] = None) -> Dict[str, Any]:
+        """Process receipt using OCR and Ollama API
+        
+        When paragon_id is given, items recognised in the streamed LLM response are
+        published to the receipt's progress fields as they arrive.
+        """
         try:
             # Step 1: Extract text using OCR
             log_to_db(
@@ -351,7 +747,8 @@ class ReceiptProcessor:
                 })
             )
             
-            extracted_text = self._extract_text_from_image(image_path)
+            # OCR is blocking; run it off the event loop so other receipts can progress
+            extracted_text = await asyncio.to_thread(self._extract_text_cached, image_path)
             
             if not extracted_text.strip():
                 logger.warning(f"No text extracted from receipt: {image_path}")
@@ -371,13 +768,21 @@ class ReceiptProcessor:
                 })
             )
             
+            llm_cache_key = make_key(extracted_text, self.prompt_version, settings.OLLAMA_MODEL)
+            if self.cache:
+                cached_receipt = self.cache.get("llm", llm_cache_key)
+                if cached_receipt is not None:
+                    logger.info(f"LLM result cache hit for: {image_path}")
+                    return Receipt.model_validate(cached_receipt).model_dump()
+            
             prompt = self._get_receipt_prompt_for_text_input(extracted_text)
             
+            system_prompt = "Jesteś pomocnym asystentem specjalizującym się w analizie tekstu z paragonów sklepowych i strukturyzowaniu go w formacie JSON."
             try:
-                llm_response = await ollama_generate(
-                    prompt=prompt,
-                    system="Jesteś pomocnym asystentem specjalizującym się w analizie tekstu z paragonów sklepowych i strukturyzowaniu go w formacie JSON."
-                )
+                if settings.OLLAMA_STREAMING:
+                    llm_response = await self._generate_streaming(prompt, system_prompt, paragon_id)
+                else:
+                    llm_response = await ollama_generate(prompt=prompt, system=system_prompt)
             except OllamaTimeoutError as e:
                 logger.error(f"Timeout while processing receipt with Ollama: {str(e)}", exc_info=True)
                 raise HTTPException(
@@ -396,11 +801,23 @@ class ReceiptProcessor:
                 json.dumps({
                     "file_path": str(image_path),
                     "stage": "llm_analysis",
-                    "status": "completed"
+                    "status": "completed",
+                    "streamed_items": llm_response.get("streamed_items") if isinstance(llm_response, dict) else None
                 })
             )
             
-            return self._parse_ollama_response(llm_response)
+            receipt_data = None
+            if isinstance(llm_response, dict) and llm_response.get("tool_call_json"):
+                try:
+                    receipt_data = self._parse_tool_call_json(llm_response["tool_call_json"])
+                except ValueError as e:
+                    logger.warning(f"Streamed tool_call rejected, parsing the whole response instead: {str(e)}")
+            if receipt_data is None:
+                receipt_data = self._parse_ollama_response(llm_response)
+            
+            if self.cache:
+                self.cache.set("llm", llm_cache_key, receipt_data)
+            return receipt_data
 
         except requests.Timeout as e:
             logger.error(f"Timeout while processing receipt: {str(e)}", exc_info=True)
@@ -427,6 +844,47 @@ class ReceiptProcessor:
                 detail="Error processing receipt"
             )
 
+    async def _generate_streaming(self, prompt: str, system: str, paragon_id: Optional[int] = None) -> Dict[str, Any]:
+        """Stream the LLM response and stop as soon as the tool_call JSON object closes"""
+        parser = StreamingCartParser()
+        progress = ItemProgressPublisher(self._publish_item_progress, paragon_id)
+
+        def on_chunk(text: str) -> bool:
+            for item in parser.feed(text):
+                progress.item(item, len(parser.items))
+            return parser.complete
+
+        try:
+            response = await ollama_generate_stream(prompt=prompt, system=system, on_chunk=on_chunk)
+        except BaseException:
+            # A late progress write must not overwrite the failure status set by the caller
+            await progress.close(publish_pending=False)
+            raise
+        await progress.close()
+        response["streamed_items"] = len(parser.items)
+        if parser.complete:
+            response["tool_call_json"] = parser.json_text
+        logger.info(
+            f"Streamed LLM response: {len(parser.items)} items, "
+            f"complete={parser.complete}, stopped_early={response.get('stopped_early')}"
+        )
+        return response
+
+    def _publish_item_progress(self, paragon_id: Optional[int], item: Dict[str, Any], count: int) -> None:
+        """Publish a recognised item to the receipt's progress fields (blocking, see ItemProgressPublisher)"""
+        if paragon_id is None:
+            return
+        try:
+            with SessionLocal() as db:
+                paragon = db.get(Paragon, paragon_id)
+                if paragon:
+                    paragon.status_przetwarzania = StatusParagonu.PRZETWARZANY_AI
+                    paragon.progress_percentage = min(50 + 5 * count, 90)
+                    paragon.status_szczegolowy = f"Rozpoznano produkt {count}: {item.get('name', '')}"
+                    db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to publish progress for receipt {paragon_id}: {str(e)}")
+
     def _get_receipt_prompt_for_text_input(self, receipt_text: str) -> str:
         """Get the prompt for receipt processing with text input"""
         return f"""
@@ -474,6 +932,35 @@ Tekst paragonu:
         json_text = re.sub(r"'([^']*)':", r'"\1":', json_text)
         return json_text
 
+    def _extract_cart_data(self, tool_call_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Get cart data out of a parsed tool_call object"""
+        if 'name' in tool_call_data and 'arguments' in tool_call_data:
+            arguments = tool_call_data['arguments']
+            
+            # Different argument formats
+            if 'cart' in arguments:
+                cart_data = arguments['cart']
+                if isinstance(cart_data, str):
+                    return json.loads(cart_data)
+                return cart_data
+            # Fallback - use arguments directly
+            return arguments
+        return tool_call_data
+
+    def _parse_tool_call_json(self, tool_call_json: str) -> Dict[str, Any]:
+        """Parse a complete tool_call JSON object cut out of the streamed response"""
+        try:
+            tool_call_data = json.loads(self._fix_json_syntax(tool_call_json))
+            data = self._extract_cart_data(tool_call_data)
+            validated_receipt = Receipt.model_validate(data)
+            return validated_receipt.model_dump()
+        except (json.JSONDecodeError, AttributeError, TypeError) as e:
+            logger.debug(f"Streamed tool_call JSON: {tool_call_json}")
+            raise ValueError(f"Invalid JSON in tool_call: {e}")
+        except ValidationError as e:
+            logger.debug(f"Streamed tool_call JSON: {tool_call_json}")
+            raise ValueError(f"Invalid receipt data structure: {e}")
+
     def _parse_ollama_response(self, response: Any) -> Dict[str, Any]:
         """Parse Ollama's response into structured data"""
         try:
@@ -488,34 +975,19 @@ Tekst paragonu:
 
             logger.debug(f"Processing response text: {response_text[:200]}...")
 
-            # Parse tool_call format
-            tool_call_pattern = r'\s*({.*?})\s*'
-            tool_call_match = re.search(tool_call_pattern, response_text, re.DOTALL)
+            # Parse tool_call format: the first JSON object in the text, nested objects included
+            tool_call_start = response_text.find("{")
             
-            if tool_call_match:
-                tool_call_json = tool_call_match.group(1)
+            if tool_call_start != -1:
+                tool_call_json = response_text[tool_call_start:]
                 logger.debug(f"Extracted tool_call JSON: {tool_call_json[:300]}...")
                 
                 try:
                     # Try to fix basic JSON errors
                     tool_call_json = self._fix_json_syntax(tool_call_json)
-                    tool_call_data = json.loads(tool_call_json)
+                    tool_call_data, _ = json.JSONDecoder().raw_decode(tool_call_json)
                     
-                    if 'name' in tool_call_data and 'arguments' in tool_call_data:
-                        arguments = tool_call_data['arguments']
-                        
-                        # Different argument formats
-                        if 'cart' in arguments:
-                            cart_data = arguments['cart']
-                            if isinstance(cart_data, str):
-                                data = json.loads(cart_data)
-                            else:
-                                data = cart_data
-                        else:
-                            # Fallback - use arguments directly
-                            data = arguments
-                    else:
-                        data = tool_call_data
+                    data = self._extract_cart_data(tool_call_data)
                     
                 except json.JSONDecodeError as e:
                     logger.error(f"Failed to parse tool_call JSON: {e}")
@@ -0,0 +1,190 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from config import get_settings
+import hashlib
+import threading
+import logging
+import shutil
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+def hash_bytes(data: bytes) -> str:
+    """Get SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Get SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_key(*parts: str) -> str:
+    """Build a cache key from several text parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = part.encode("utf-8")
+        # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+class ResultCache:
+    """Two-tier content-addressed cache: in-memory LRU in front of a size-bounded disk LRU
+
+    Entries are JSON documents grouped in namespaces (e.g. "ocr", "llm"). The disk tier
+    uses file modification time as recency, so it is shared between the web app and
+    Celery workers running on the same host.
+    """
+
+    FINGERPRINT_FILE = "fingerprint.json"
+
+    def __init__(self, directory: Path, max_bytes: int, memory_items: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.directory / namespace / key[:2] / f"{key}.json"
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value or None"""
+        memory_key = f"{namespace}:{key}"
+        with self._lock:
+            if memory_key in self._memory:
+                self._memory.move_to_end(memory_key)
+                self.stats["memory_hits"] += 1
+                return self._memory[memory_key]
+
+        path = self._path(namespace, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["disk_hits"] += 1
+        self._remember(memory_key, value)
+        return value
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Store a JSON-serializable value"""
+        self._remember(f"{namespace}:{key}", value)
+
+        path = self._path(namespace, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._account(len(data))
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {str(e)}")
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        """Drop one namespace or the whole cache"""
+        with self._lock:
+            if namespace is None:
+                self._memory.clear()
+            else:
+                for memory_key in [k for k in self._memory if k.startswith(f"{namespace}:")]:
+                    del self._memory[memory_key]
+            self._disk_bytes = None
+
+        target = self.directory / namespace if namespace else self.directory
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Result cache invalidated: {namespace or 'all'}")
+
+    def ensure_fingerprint(self, namespace: str, fingerprint: Dict[str, str]) -> None:
+        """Invalidate a namespace when its fingerprint (model, prompt version...) changed"""
+        fingerprint_path = self.directory / namespace / self.FINGERPRINT_FILE
+        try:
+            with open(fingerprint_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            stored = None
+
+        if stored == fingerprint:
+            return
+        if stored is not None:
+            logger.info(f"Cache fingerprint changed for '{namespace}': {stored} -> {fingerprint}")
+            self.invalidate(namespace)
+
+        fingerprint_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(fingerprint_path, "w", encoding="utf-8") as f:
+            json.dump(fingerprint, f)
+
+    def _remember(self, memory_key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[memory_key] = value
+            self._memory.move_to_end(memory_key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _entries(self):
+        return [p for p in self.directory.glob("*/*/*.json") if p.is_file()]
+
+    def _account(self, added: int) -> None:
+        """Track disk usage and evict least recently used entries above the limit"""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self._entries())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_bytes:
+                return
+
+            # Other processes write to the same directory, so recount before evicting
+            entries = []
+            for p in self._entries():
+                try:
+                    st = p.stat()
+                    entries.append((st.st_mtime, st.st_size, p))
+                except FileNotFoundError:
+                    continue
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(p)
+                total -= size
+                self.stats["evictions"] += 1
+            self._disk_bytes = total
+
+    def _remove(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+@lru_cache()
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache"""
+    settings = get_settings()
+    return ResultCache(
+        Path(settings.RESULT_CACHE_DIR),
+        settings.RESULT_CACHE_MAX_BYTES,
+        settings.RESULT_CACHE_MEMORY_ITEMS
+    )
@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Request, Query, Depends, HTTPException, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, StreamingResponse
 from sqlmodel import Session, select
-from typing import Optional, List
-from database import get_session
+from typing import Optional, List, Tuple
+from database import get_session, get_read_session
 from db_logger import log_to_db
-from models import LogBledow, PoziomLogu
+from log_archive import archive_logs, ArchiveInProgressError
+from config import get_settings
+from log_tail import tail_lines, follow
+from log_search import search_logs
+from models import LogBledow, LogLicznik, PoziomLogu
+from sqlalchemy import func, tuple_
 import json
 from datetime import datetime
 from pathlib import Path
@@ -15,31 +21,51 @@ import subprocess
 router = APIRouter(prefix="/logi", tags=["logi"])
 templates = Jinja2Templates(directory="templates")
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with get_session() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
+def _encode_cursor(log: LogBledow) -> str:
+    return f"{log.timestamp.isoformat()}_{log.id}"
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, log_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def count_logs(db: Session, poziom: Optional[str] = None) -> int:
+    """Row count from the trigger-maintained LogLicznik table instead of COUNT(*)"""
+    query = select(func.coalesce(func.sum(LogLicznik.liczba), 0))
+    if poziom:
+        query = query.where(LogLicznik.poziom == poziom)
+    return db.exec(query).one()
 
 @router.get("/", response_class=HTMLResponse)
 def lista_logow(request: Request, 
                 poziom: Optional[str] = Query(None),
-                page: int = Query(1, ge=1),
+                po: Optional[str] = Query(None, description="Kursor: starsze wpisy niż podany"),
+                przed: Optional[str] = Query(None, description="Kursor: nowsze wpisy niż podany"),
                 per_page: int = Query(30, ge=1, le=100)):
-    with get_session() as db:
+    with get_read_session() as db:
         query = db.query(LogBledow)
         if poziom:
             query = query.filter(LogBledow.poziom == poziom)
-        total = query.count()
-        logs = query.order_by(LogBledow.timestamp.desc()) \
-                    .offset((page-1)*per_page).limit(per_page).all()
+        # Keyset pagination on (timestamp, id): every page is an index range scan
+        key = tuple_(LogBledow.timestamp, LogBledow.id)
+        if przed:
+            logs = query.filter(key > _decode_cursor(przed)) \
+                        .order_by(LogBledow.timestamp.asc(), LogBledow.id.asc()) \
+                        .limit(per_page + 1).all()
+            has_newer = len(logs) > per_page
+            logs = list(reversed(logs[:per_page]))
+            has_older = True
+        else:
+            if po:
+                query = query.filter(key < _decode_cursor(po))
+            logs = query.order_by(LogBledow.timestamp.desc(), LogBledow.id.desc()) \
+                        .limit(per_page + 1).all()
+            has_older = len(logs) > per_page
+            logs = logs[:per_page]
+            has_newer = po is not None
+        total = count_logs(db, poziom)
         poziomy = [p.value for p in PoziomLogu]
         return templates.TemplateResponse(
             "logi/lista.html",
@@ -48,9 +74,10 @@ def lista_logow(request: Request,
                 "logs": logs,
                 "poziomy": poziomy,
                 "selected_poziom": poziom,
-                "page": page,
                 "per_page": per_page,
-                "total": total
+                "total": total,
+                "newer_cursor": _encode_cursor(logs[0]) if logs and has_newer else None,
+                "older_cursor": _encode_cursor(logs[-1]) if logs and has_older else None
             }
         )
 
@@ -167,46 +194,84 @@ async def get_log(
         )
         raise
 
+@router.get("/szukaj")
+def szukaj_logow(
+    q: Optional[str] = Query(None, description="Pełnotekstowo w komunikacie i szczegółach; słowo* szuka po prefiksie"),
+    poziom: Optional[PoziomLogu] = Query(None),
+    paragon_id: Optional[int] = Query(None),
+    file_path: Optional[str] = Query(None),
+    stage: Optional[str] = Query(None),
+    przed_id: Optional[int] = Query(None, description="Kursor: id ostatniego wpisu z poprzedniej strony"),
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Search logs with highlighted matches, newest first"""
+    with get_read_session() as db:
+        results = search_logs(
+            db,
+            query=q,
+            poziom=poziom.value if poziom else None,
+            paragon_id=paragon_id,
+            file_path=file_path,
+            stage=stage,
+            before_id=przed_id,
+            limit=limit
+        )
+    return {
+        "results": jsonable_encoder(results),
+        "next_cursor": results[-1]["id"] if len(results) == limit else None
+    }
+
 @router.post("/clear")
 def clear_logs(request: Request):
-    with get_session() as db:
-        logs = db.query(LogBledow).order_by(LogBledow.timestamp.asc()).all()
-        if logs:
-            # Archiwizacja do pliku
-            archive_dir = Path("logs")
-            archive_dir.mkdir(exist_ok=True)
-            archive_file = archive_dir / f"logs_archive_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(archive_file, "w", encoding="utf-8") as f:
-                json.dump([
-                    {
-                        "timestamp": log.timestamp.isoformat(),
-                        "poziom": log.poziom,
-                        "modul_aplikacji": log.modul_aplikacji,
-                        "funkcja": log.funkcja,
-                        "komunikat_bledu": log.komunikat_bledu,
-                        "szczegoly_techniczne": log.szczegoly_techniczne
-                    } for log in logs
-                ], f, ensure_ascii=False, indent=2)
-            # Usuń logi z bazy
-            db.query(LogBledow).delete()
-            db.commit()
+    settings = get_settings()
+    try:
+        # Strumieniowa archiwizacja partiami do skompresowanego NDJSON
+        result = archive_logs(
+            archive_dir=settings.LOG_ARCHIVE_DIR,
+            chunk_size=settings.LOG_ARCHIVE_CHUNK_SIZE,
+            compression=settings.LOG_ARCHIVE_COMPRESSION
+        )
+        message = f"Logi zostaly wyczyszczone i zarchiwizowane! ({result['rows']})"
+    except ArchiveInProgressError:
+        message = "Archiwizacja logow juz trwa, sprobuj pozniej."
     # Przekierowanie z komunikatem
     response = RedirectResponse(url="/logi", status_code=303)
-    response.set_cookie('flash_msg', 'Logi zostaly wyczyszczone i zarchiwizowane!')
-    return response 
+    response.set_cookie('flash_msg', message)
+    return response
 
 @router.get("/celery", response_class=PlainTextResponse)
 @router.get("/celery/", response_class=PlainTextResponse)
-async def get_celery_logs():
+async def get_celery_logs(lines: int = Query(100, ge=1, le=5000)):
     log_path = os.path.join("logs", "celery.log")
     try:
-        with open(log_path, "r") as f:
-            lines = f.readlines()
-        # Zwróć ostatnie 100 linii
-        return "".join(lines[-100:])
+        # Czyta tylko końcowe bloki pliku, niezależnie od jego rozmiaru
+        tail, _ = tail_lines(log_path, lines)
+        return "".join(tail)
     except Exception as e:
         return f"Błąd odczytu logów Celery: {e}"
 
+@router.get("/celery/stream")
+async def stream_celery_logs(request: Request, lines: int = Query(100, ge=0, le=5000)):
+    """Server-Sent Events: last lines of the Celery log, then lines as they are appended"""
+    log_path = os.path.join("logs", "celery.log")
+    if not os.path.exists(log_path):
+        raise HTTPException(status_code=404, detail="Celery log not found")
+
+    async def events():
+        tail, offset = tail_lines(log_path, lines)
+        for line in tail:
+            yield "data: " + line.rstrip("\r\n") + "\n\n"
+        async for line in follow(log_path, offset):
+            if await request.is_disconnected():
+                break
+            yield "data: " + line.rstrip("\r") + "\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/celery/start", response_class=PlainTextResponse)
 def start_celery_worker():
     pid_file = "logs/celery_worker.pid"
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Request, Form
 from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, FileResponse
 from sqlmodel import Session, select
+from sqlalchemy import delete
 from typing import List, Optional, Tuple, Dict, Any
 import os
 import shutil
@@ -11,7 +12,9 @@ from PIL import Image
 import io
 from ollama_client import ollama_generate
 from models import Paragon, StatusParagonu, Produkt, KategoriaProduktu, LogBledow, PoziomLogu
-from database import get_session, SessionLocal
+from database import get_session, get_async_session, get_async_read_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db_logger import log_to_db
 import logging
 logger = logging.getLogger(__name__)
 import pdf2image
@@ -24,7 +27,8 @@ from forms import DodajParagonForm, EdytujProduktForm
 from wtforms import ValidationError
 from product_mapper import ProductMapper
 from urllib.parse import quote, unquote
-from tasks import process_receipt_task
+from tasks import enqueue_receipt_processing
+from duplicate_index import get_duplicate_index, compute_image_hash, compute_file_hash
 import json
 
 router = APIRouter(prefix="/paragony", tags=["paragony"])
@@ -55,7 +59,9 @@ async def _create_paragon_record(
     filename: str,
     saved_path: str,
     mime_type: str,
-    komentarz: Optional[str] = None
+    komentarz: Optional[str] = None,
+    phash: Optional[str] = None,
+    sha256: Optional[str] = None
 ) -> Tuple[Paragon, int]:
     """Create a new paragon record in database"""
     paragon = Paragon(
@@ -63,7 +69,9 @@ async def _create_paragon_record(
         sciezka_pliku_na_serwerze=saved_path,
         mime_type_pliku=mime_type,
         komentarz=komentarz,
-        status_przetwarzania=StatusParagonu.OCZEKUJE_NA_PODGLAD
+        status_przetwarzania=StatusParagonu.OCZEKUJE_NA_PODGLAD,
+        phash=phash,
+        sha256=sha256
     )
     db.add(paragon)
     db.commit()
@@ -81,6 +89,45 @@ async def _delete_paragon_file(file_path: Path) -> None:
     except OSError as e:
         logger.error(f"Error deleting receipt file {file_path}: {str(e)}")
 
+def _find_duplicate_paragon(
+    db: Session,
+    saved_path: str
+) -> Tuple[Optional[Paragon], Optional[Paragon], Optional[str], Optional[str]]:
+    """
+    Look up receipts matching a saved upload
+
+    Returns (duplicate, similar, sha256, phash): duplicate has the identical file content,
+    similar only a close perceptual hash, which different receipts from the same store
+    can share, so it is left to the user to decide.
+    """
+    if not settings.DUPLICATE_DETECTION_ENABLED:
+        return None, None, None, None
+    sha256 = compute_file_hash(Path(saved_path))
+    duplicate = db.exec(select(Paragon).where(Paragon.sha256 == sha256)).first()
+    if duplicate:
+        logger.info(f"Upload {saved_path} is identical to receipt {duplicate.id}")
+        return duplicate, None, sha256, None
+
+    try:
+        phash = compute_image_hash(Path(saved_path))
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash for {saved_path}: {str(e)}")
+        return None, None, sha256, None
+
+    index = get_duplicate_index()
+    match = index.find(phash)
+    if not match:
+        return None, None, sha256, phash
+
+    paragon_id, distance = match
+    similar = db.get(Paragon, paragon_id)
+    if not similar:
+        # Deleted by another process
+        index.remove(paragon_id)
+        return None, None, sha256, phash
+    logger.info(f"Upload {saved_path} is similar to receipt {paragon_id} (distance {distance})")
+    return None, similar, sha256, phash
+
 async def _validate_product_form(
     form_data: Dict[str, Any],
     produkt_id: int
@@ -108,51 +155,37 @@ async def _update_product_from_form(
     produkt.ilosc_na_paragonie = int(form.ilosc_na_paragonie.data)
     produkt.data_waznosci = form.data_waznosci.data
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
-
 # === Route Handlers ===
 
 @router.get("/", response_class=HTMLResponse)
-async def lista_paragonow(request: Request):
+async def lista_paragonow(request: Request, db: AsyncSession = Depends(get_async_read_session)):
     """Show list of receipts with sorting and filtering"""
     sort = request.query_params.get("sort", "data")
     status = request.query_params.get("status", "")
     nazwa = request.query_params.get("nazwa", "")
-    with get_session() as db:
-        query = db.query(Paragon)
-        if status:
-            query = query.filter(Paragon.status_przetwarzania == status)
-        if nazwa:
-            query = query.filter(Paragon.nazwa_pliku_oryginalnego.ilike(f"%{nazwa}%"))
-        if sort == "status":
-            query = query.order_by(Paragon.status_przetwarzania, Paragon.data_wyslania.desc())
-        else:
-            query = query.order_by(Paragon.data_wyslania.desc())
-        paragony = query.all()
-        # Lista statusów do filtrowania
-        statusy = [(s.name, s.value) for s in StatusParagonu]
-        return templates.TemplateResponse(
-            "paragony/lista.html",
-            {
-                "request": request,
-                "paragony": paragony,
-                "statusy": statusy,
-                "selected_status": status,
-                "selected_sort": sort,
-                "selected_nazwa": nazwa
-            }
-        )
+    query = select(Paragon)
+    if status:
+        query = query.where(Paragon.status_przetwarzania == status)
+    if nazwa:
+        query = query.where(Paragon.nazwa_pliku_oryginalnego.ilike(f"%{nazwa}%"))
+    if sort == "status":
+        query = query.order_by(Paragon.status_przetwarzania, Paragon.data_wyslania.desc())
+    else:
+        query = query.order_by(Paragon.data_wyslania.desc())
+    paragony = (await db.exec(query)).all()
+    # Lista statusów do filtrowania
+    statusy = [(s.name, s.value) for s in StatusParagonu]
+    return templates.TemplateResponse(
+        "paragony/lista.html",
+        {
+            "request": request,
+            "paragony": paragony,
+            "statusy": statusy,
+            "selected_status": status,
+            "selected_sort": sort,
+            "selected_nazwa": nazwa
+        }
+    )
 
 @router.get("/dodaj", response_class=HTMLResponse)
 async def dodaj_paragon_form(request: Request):
@@ -202,9 +235,34 @@ async def dodaj_paragon(request: Request, file: UploadFile = File(...), komentar
         # Create receipt record with transaction
         paragon_id = None
         with get_session() as db:
+            duplicate, similar, sha256, phash = _find_duplicate_paragon(db, saved_path)
+            similar_id = similar.id if similar else None
+            if duplicate:
+                # Link to the existing results instead of processing the same receipt again
+                duplicate_id = duplicate.id
+                try:
+                    Path(saved_path).unlink()
+                except OSError:
+                    pass
+                log_to_db(
+                    PoziomLogu.INFO,
+                    "routes.paragony",
+                    "add_receipt",
+                    f"Wykryto duplikat paragonu: {duplicate_id}",
+                    json.dumps({
+                        "filename": file.filename,
+                        "paragon_id": duplicate_id,
+                        "sha256": sha256,
+                        "status": "duplicate"
+                    })
+                )
+                response = RedirectResponse(url=f"/paragony/podglad/{duplicate_id}", status_code=303)
+                response.set_cookie('flash_msg', quote('Ten paragon został już dodany wcześniej.'))
+                return response
+
             try:
                 paragon, paragon_id = await _create_paragon_record(
-                    db, file.filename, saved_path, file.content_type, komentarz
+                    db, file.filename, saved_path, file.content_type, komentarz, phash, sha256
                 )
                 db.commit()
             except Exception as e:
@@ -216,9 +274,25 @@ async def dodaj_paragon(request: Request, file: UploadFile = File(...), komentar
                     pass
                 raise HTTPException(status_code=500, detail="Error creating receipt record")
         
+        if similar_id:
+            # Possibly the same receipt photographed again: process only once the user confirms
+            log_to_db(
+                PoziomLogu.INFO,
+                "routes.paragony",
+                "add_receipt",
+                f"Paragon {paragon_id} jest podobny do paragonu {similar_id}",
+                json.dumps({
+                    "paragon_id": paragon_id,
+                    "similar_id": similar_id,
+                    "phash": phash,
+                    "status": "similar"
+                })
+            )
+            return RedirectResponse(url=f"/paragony/podglad/{paragon_id}?podobny_do={similar_id}", status_code=303)
+
         # Start Celery task for processing
         if paragon_id:
-            process_receipt_task.delay(paragon_id)
+            enqueue_receipt_processing(paragon_id)
         
         # Set flash message
         response = RedirectResponse(url="/paragony", status_code=303)
@@ -254,8 +328,8 @@ async def dodaj_paragon(request: Request, file: UploadFile = File(...), komentar
         raise
 
 @router.get("/podglad/{paragon_id}", response_class=HTMLResponse)
-async def podglad_paragonu(request: Request, paragon_id: int):
-    """Show receipt details and processing status"""
+async def podglad_paragonu(request: Request, paragon_id: int, podobny_do: Optional[int] = None):
+    """Show receipt details and processing status, warning when the upload resembles another receipt"""
     with get_session() as db:
         paragon = await _get_paragon_or_404(db, paragon_id)
         
@@ -272,21 +346,23 @@ async def podglad_paragonu(request: Request, paragon_id: int):
             {
                 "request": request,
                 "paragon": paragon,
-                "actual_filename": actual_filename
+                "actual_filename": actual_filename,
+                "podobny_do": podobny_do
             }
         )
 
 @router.get("/status/{paragon_id}", name="paragony.status_przetwarzania")
-async def status_przetwarzania(paragon_id: int):
+async def status_przetwarzania(paragon_id: int, db: AsyncSession = Depends(get_async_session)):
     """Get receipt processing status"""
-    with get_session() as db:
-        paragon = await _get_paragon_or_404(db, paragon_id)
-        return {
-            "status": paragon.status_przetwarzania,
-            "data_przetworzenia": paragon.data_przetworzenia,
-            "blad": paragon.blad_przetwarzania,
-            "status_szczegolowy": paragon.status_szczegolowy
-        }
+    paragon = await db.get(Paragon, paragon_id)
+    if not paragon:
+        raise HTTPException(status_code=404, detail="Paragon nie znaleziony")
+    return {
+        "status": paragon.status_przetwarzania,
+        "data_przetworzenia": paragon.data_przetworzenia,
+        "blad": paragon.blad_przetwarzania,
+        "status_szczegolowy": paragon.status_szczegolowy
+    }
 
 @router.get("/{paragon_id}/import", response_class=HTMLResponse)
 async def import_products_get(request: Request, paragon_id: int, session: Session = Depends(get_session)):
@@ -367,30 +443,50 @@ async def usun_paragon(request: Request, paragon_id: int):
         if paragon.sciezka_pliku_na_serwerze:
             await _delete_paragon_file(Path(paragon.sciezka_pliku_na_serwerze))
         
-        # Delete record
+        # Delete the receipt lines in one statement, then the record
+        db.execute(delete(Produkt).where(Produkt.paragon_id == paragon_id))
         db.delete(paragon)
         db.commit()
+        get_duplicate_index().remove(paragon_id)
         
         response = RedirectResponse(url="/paragony", status_code=303)
         response.set_cookie('flash_msg', quote('Paragon został usunięty!'))
         return response
 
+def _decode_suggestions(produkty: List[Produkt]) -> Dict[int, List[Dict[str, Any]]]:
+    """Mapping suggestions stored by the pipeline, decoded per receipt line id"""
+    sugestie = {}
+    for produkt in produkty:
+        try:
+            sugestie[produkt.id] = json.loads(produkt.sugestie_mapowania) if produkt.sugestie_mapowania else []
+        except ValueError:
+            sugestie[produkt.id] = []
+    return sugestie
+
 @router.get("/{paragon_id}/mapowanie", response_class=HTMLResponse)
 async def mapowanie_produktow(
     request: Request,
     paragon_id: int,
-    session: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_read_session)
 ):
-    paragon = await _get_paragon_or_404(session, paragon_id)
+    """Show receipt products with the mapping suggestions precomputed by the Celery pipeline"""
+    paragon = await db.get(Paragon, paragon_id)
+    if not paragon:
+        raise HTTPException(status_code=404, detail="Paragon nie znaleziony")
         
     if paragon.status_przetwarzania != StatusParagonu.PRZETWORZONY_OK:
         raise HTTPException(status_code=400, detail="Paragon nie został jeszcze przetworzony")
     
+    produkty = (await db.exec(
+        select(Produkt).where(Produkt.paragon_id == paragon_id).order_by(Produkt.id)
+    )).all()
     return templates.TemplateResponse(
         "paragony/mapowanie.html",
         {
             "request": request,
-            "paragon": paragon
+            "paragon": paragon,
+            "produkty": produkty,
+            "sugestie": _decode_suggestions(produkty)
         }
     )
 
@@ -405,6 +501,14 @@ async def mapuj_produkt(
     if not produkt:
         raise HTTPException(status_code=404, detail="Produkt nie znaleziony")
     
+    if "zmapowany_do_id" in data:
+        # Mapping to a pantry product also teaches the mapper this receipt name
+        try:
+            ProductMapper(session).update_product_mapping(produkt_id, data["zmapowany_do_id"])
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return {"status": "success"}
+    
     produkt.nazwa = data.get("nazwa", produkt.nazwa)
     produkt.kategoria = data.get("kategoria", produkt.kategoria)
     session.commit()
@@ -429,5 +533,5 @@ async def ignoruj_produkt(
 @router.post("/przetworz/{paragon_id}")
 async def przetworz_paragon(paragon_id: int):
     """Manually trigger receipt processing"""
-    process_receipt_task.delay(paragon_id)
+    enqueue_receipt_processing(paragon_id)
     return RedirectResponse(url=f"/paragony/podglad/{paragon_id}", status_code=303) 
\ No newline at end of file
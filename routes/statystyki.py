@@ -2,19 +2,6 @@ from models import LogBledow, PoziomLogu
 from db_logger import log_to_db
 import json
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
-
 @router.get("/statystyki/", response_model=Statystyki)
 async def get_statistics(
     db: Session = Depends(get_db)
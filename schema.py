@@ -0,0 +1,87 @@
+from pathlib import Path
+from typing import Optional
+from functools import lru_cache
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from database import engine, DATABASE_URL
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+
+# Schema created by SQLModel.metadata.create_all before migrations existed
+BASELINE_REVISION = "0001"
+
+class SchemaNotReadyError(RuntimeError):
+    """Raised when the database schema is behind and auto-migration is disabled"""
+    pass
+
+_ready = False
+_lock = threading.Lock()
+
+def alembic_config(connection=None) -> Config:
+    """Alembic configuration independent of the current working directory"""
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+@lru_cache()
+def head_revision() -> str:
+    """Revision the code expects, read from the migration scripts once per process"""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def schema_fingerprint() -> Optional[str]:
+    """Revision stamped in the database; a single query against alembic_version"""
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+def is_schema_current() -> bool:
+    """Fast check for workers: compare the database fingerprint with the code's head"""
+    return schema_fingerprint() == head_revision()
+
+def migrate() -> None:
+    """Upgrade the database to the head revision"""
+    with engine.begin() as connection:
+        config = alembic_config(connection)
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current is None and inspect(connection).has_table("paragon"):
+            logger.info(f"Unversioned database found, stamping baseline revision {BASELINE_REVISION}")
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+
+def ensure_schema(auto_migrate: Optional[bool] = None) -> None:
+    """Verify, and if allowed migrate, the schema once per process; later calls are free"""
+    global _ready
+    if _ready:
+        return
+    with _lock:
+        if _ready:
+            return
+        if auto_migrate is None:
+            # Not a Settings field: config.py runs this check while it is still being imported
+            auto_migrate = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+
+        current, head = schema_fingerprint(), head_revision()
+        if current != head:
+            if not auto_migrate:
+                raise SchemaNotReadyError(
+                    f"Database schema is at revision {current}, expected {head}. Run: alembic upgrade head"
+                )
+            logger.info(f"Migrating database schema from {current} to {head}")
+            try:
+                migrate()
+            except Exception:
+                # Another process may have finished the same migration first
+                if schema_fingerprint() != head:
+                    raise
+        _ready = True
+        logger.info(f"Database schema ready at revision {head}")
@@ -6,25 +6,29 @@ import multiprocessing
 # Set multiprocessing start method to 'spawn' for CUDA compatibility
 multiprocessing.set_start_method('spawn', force=True)
 
-from celery import Celery, shared_task
-from db_logger import log_to_db
-from database import SessionLocal, engine, create_db_and_tables
+from celery import Celery, shared_task, chain
+from db_logger import log_to_db, db_log_sink
+from database import SessionLocal, engine, create_db_and_tables, sqlite_maintenance, DATABASE_URL
 from models import Paragon, StatusParagonu, Produkt, KategoriaProduktu, StatusMapowania, LogBledow, PoziomLogu
-from receipt_processor import ReceiptProcessor
-from datetime import datetime
+from receipt_processor import ReceiptProcessor, init_ocr_backend, shutdown_ocr_backend
+from datetime import datetime, timedelta
 import logging
 logger = logging.getLogger(__name__)
 from pathlib import Path
 from decimal import Decimal
 from product_mapper import ProductMapper
-from ollama_client import OllamaError, OllamaTimeoutError, OllamaConnectionError, OllamaModelError
+from ollama_client import OllamaError, OllamaTimeoutError, OllamaConnectionError, OllamaModelError, close_ollama_client
 from config import get_settings
 from user_activity_logger import user_activity_logger
+from worker_loop import worker_loop
+from log_archive import archive_logs, ArchiveInProgressError
 import json
 import asyncio
-from celery.signals import worker_process_init
+from celery.signals import worker_process_init, worker_process_shutdown
 from sqlmodel import SQLModel
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert
+from typing import Any, Dict, Optional
 from contextlib import contextmanager
 
 settings = get_settings()
@@ -43,19 +47,49 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
+# Periodic maintenance, run with: celery -A tasks beat
+beat_schedule = {}
+if DATABASE_URL.startswith("sqlite"):
+    beat_schedule['sqlite-maintenance'] = {
+        'task': 'sqlite_maintenance',
+        'schedule': timedelta(minutes=settings.SQLITE_MAINTENANCE_INTERVAL_MINUTES),
+    }
+if settings.LOG_RETENTION_DAYS > 0:
+    beat_schedule['archive-old-logs'] = {
+        'task': 'archive_old_logs',
+        'schedule': timedelta(hours=settings.LOG_RETENTION_INTERVAL_HOURS),
+    }
+celery_app.conf.beat_schedule = beat_schedule
+
 receipt_processor = ReceiptProcessor()
 
 @worker_process_init.connect
 def init_worker(**kwargs):
     """Initialize worker process"""
     try:
-        # Create database tables in worker process
+        # Verify or migrate the schema once per worker process
         create_db_and_tables()
-        logger.info("Database tables created in worker process")
+        logger.info("Database schema ready in worker process")
+        # Load OCR traineddata once per worker process instead of once per image
+        init_ocr_backend()
+        # One event loop per worker process, shared by all tasks
+        worker_loop.start()
     except Exception as e:
         logger.error(f"Error initializing worker: {str(e)}", exc_info=True)
         raise
 
+@worker_process_shutdown.connect
+def shutdown_worker(**kwargs):
+    """Release worker process resources"""
+    try:
+        shutdown_ocr_backend()
+        if worker_loop.loop is not None:
+            worker_loop.run(close_ollama_client(), timeout=10)
+        worker_loop.stop()
+        db_log_sink.shutdown()
+    except Exception as e:
+        logger.error(f"Error shutting down worker: {str(e)}", exc_info=True)
+
 @contextmanager
 def get_db():
     """Get database session"""
@@ -65,30 +99,28 @@ def get_db():
     finally:
         db.close()
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    try:
-        with get_db() as db:
-            log = LogBledow(
-                poziom=poziom,
-                modul_aplikacji=modul,
-                funkcja=funkcja,
-                komunikat_bledu=komunikat,
-                szczegoly_techniczne=szczegoly
-            )
-            db.add(log)
-            db.commit()
-    except Exception as e:
-        logger.error(f"Failed to log to database: {str(e)}", exc_info=True)
+def _kategoria(category: Optional[str]) -> KategoriaProduktu:
+    """Category named by the LLM, or INNE when it is not one of ours"""
+    for kategoria in KategoriaProduktu:
+        if category and category.strip().lower() == kategoria.value.lower():
+            return kategoria
+    return KategoriaProduktu.INNE
+
+def _mark_failed(db: Session, paragon: Paragon, error: Exception) -> None:
+    paragon.status_przetwarzania = StatusParagonu.PRZETWORZONY_BLAD
+    paragon.status_szczegolowy = f"Błąd przetwarzania: {str(error)}"
+    paragon.blad_przetwarzania = str(error)
+    paragon.data_przetworzenia = datetime.now()
+    db.commit()
+
+def enqueue_receipt_processing(paragon_id: int):
+    """Queue a receipt through the pipeline: OCR and LLM extraction, then product mapping"""
+    return chain(process_receipt_task.s(paragon_id), map_receipt_products_task.s()).apply_async()
 
 @shared_task(name='process_receipt', bind=True)
 def process_receipt_task(self, paragon_id: int):
-    """Celery task for processing a receipt"""
+    """Celery task for processing a receipt, first stage of enqueue_receipt_processing"""
     try:
-        # Initialize database session
-        from database import SessionLocal, create_db_and_tables
-        create_db_and_tables()  # Ensure tables exist
-        
         with SessionLocal() as db:
             # Get receipt
             paragon = db.query(Paragon).filter(Paragon.id == paragon_id).first()
@@ -98,27 +130,119 @@ def process_receipt_task(self, paragon_id: int):
 
             try:
                 # Process receipt
-                result = asyncio.run(receipt_processor.process_receipt(Path(paragon.sciezka_pliku_na_serwerze)))
+                result = worker_loop.run(receipt_processor.process_receipt(Path(paragon.sciezka_pliku_na_serwerze), paragon_id))
                 
-                # Update receipt status
-                paragon.status_przetwarzania = StatusParagonu.PRZETWORZONY
-                paragon.status_szczegolowy = "Paragon przetworzony pomyślnie"
-                paragon.data_przetworzenia = datetime.now()
+                # Products are stored and mapped by the next stage, which completes the receipt
+                paragon.status_przetwarzania = StatusParagonu.PRZETWARZANY_AI
+                paragon.status_szczegolowy = "Zapisywanie produktów i przygotowanie sugestii mapowania"
+                paragon.progress_percentage = 90
+                paragon.sklep = result.get("store_name")
                 db.commit()
                 
-                return {"status": "success", "paragon_id": paragon_id, "message": "Receipt processed successfully"}
+                return {
+                    "status": "success",
+                    "paragon_id": paragon_id,
+                    "message": "Receipt processed successfully",
+                    "items": result.get("items", [])
+                }
                 
             except Exception as e:
                 # Log error and update receipt status
                 logger.error(f"Error processing receipt {paragon_id}: {str(e)}", exc_info=True)
-                paragon.status_przetwarzania = StatusParagonu.PRZETWORZONY_BLAD
-                paragon.status_szczegolowy = f"Błąd przetwarzania: {str(e)}"
-                paragon.blad_przetwarzania = str(e)
-                paragon.data_przetworzenia = datetime.now()
-                db.commit()
+                _mark_failed(db, paragon, e)
                 
                 return {"status": "error", "paragon_id": paragon_id, "message": str(e)}
                 
     except Exception as e:
         logger.error(f"Unexpected error in process_receipt_task: {str(e)}", exc_info=True)
-        return {"status": "error", "message": f"Unexpected error: {str(e)}"} 
\ No newline at end of file
+        return {"status": "error", "message": f"Unexpected error: {str(e)}"} 
+
+@shared_task(name='map_receipt_products')
+def map_receipt_products_task(result: Dict[str, Any]):
+    """Store extracted receipt items as Produkt rows with precomputed mapping suggestions"""
+    if result.get("status") != "success":
+        return result
+    paragon_id = result["paragon_id"]
+    try:
+        with SessionLocal() as db:
+            paragon = db.get(Paragon, paragon_id)
+            if not paragon:
+                logger.error(f"Receipt {paragon_id} not found")
+                return {"status": "error", "message": "Receipt not found"}
+
+            try:
+                now = datetime.utcnow()
+                rows = [
+                    {
+                        "nazwa": item["name"][:100],
+                        "kategoria": _kategoria(item.get("category")),
+                        "cena": Decimal(str(item["price"])).quantize(Decimal("0.01")),
+                        "paragon_id": paragon_id,
+                        "ilosc_na_paragonie": max(1, round(item["quantity"])),
+                        "aktualna_ilosc": max(1, round(item["quantity"])),
+                        "status_mapowania": StatusMapowania.OCZEKUJE,
+                        "data_dodania": now,
+                        "data_aktualizacji": now
+                    }
+                    for item in result["items"]
+                ]
+                # Reprocessing a receipt replaces the items of the previous run
+                db.execute(delete(Produkt).where(Produkt.paragon_id == paragon_id))
+                produkty = db.scalars(insert(Produkt).returning(Produkt), rows).all() if rows else []
+                # Scores all lines in one pass and commits the rows with their suggestions
+                ProductMapper(db).process_receipt_products(produkty)
+
+                paragon.status_przetwarzania = StatusParagonu.PRZETWORZONY_OK
+                paragon.status_szczegolowy = "Paragon przetworzony pomyślnie"
+                paragon.progress_percentage = 100
+                paragon.data_przetworzenia = datetime.now()
+                db.commit()
+
+                return {"status": "success", "paragon_id": paragon_id, "products": len(produkty)}
+
+            except Exception as e:
+                logger.error(f"Error mapping products of receipt {paragon_id}: {str(e)}", exc_info=True)
+                db.rollback()
+                _mark_failed(db, paragon, e)
+
+                return {"status": "error", "paragon_id": paragon_id, "message": str(e)}
+
+    except Exception as e:
+        logger.error(f"Unexpected error in map_receipt_products_task: {str(e)}", exc_info=True)
+        return {"status": "error", "message": f"Unexpected error: {str(e)}"}
+
+@shared_task(name='archive_old_logs')
+def archive_old_logs_task():
+    """Archive and delete LogBledow rows older than LOG_RETENTION_DAYS"""
+    try:
+        result = archive_logs(
+            archive_dir=settings.LOG_ARCHIVE_DIR,
+            older_than_days=settings.LOG_RETENTION_DAYS,
+            chunk_size=settings.LOG_ARCHIVE_CHUNK_SIZE,
+            compression=settings.LOG_ARCHIVE_COMPRESSION
+        )
+        log_to_db(
+            PoziomLogu.INFO,
+            "tasks",
+            "archive_old_logs_task",
+            f"Zarchiwizowano stare logi: {result['rows']}",
+            json.dumps({"retention_days": settings.LOG_RETENTION_DAYS, **result})
+        )
+        return {"status": "success", **result}
+    except ArchiveInProgressError as e:
+        logger.info(f"Skipping scheduled log archival: {str(e)}")
+        return {"status": "skipped", "message": str(e)}
+    except Exception as e:
+        logger.error(f"Error archiving old logs: {str(e)}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+@shared_task(name='sqlite_maintenance')
+def sqlite_maintenance_task():
+    """Checkpoint the SQLite WAL and run PRAGMA optimize"""
+    try:
+        result = sqlite_maintenance()
+        logger.info(f"SQLite maintenance finished: {result}")
+        return {"status": "success", **result}
+    except Exception as e:
+        logger.error(f"Error during SQLite maintenance: {str(e)}", exc_info=True)
+        return {"status": "error", "message": str(e)}
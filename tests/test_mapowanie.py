@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+@pytest.fixture(scope="module")
+def paragony(tmp_path_factory):
+    """routes.paragony imported against a scratch database"""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}")
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+    import routes.paragony
+    return routes.paragony
+
+def test_mapowanie_renders_precomputed_suggestions(paragony):
+    from models import Paragon, Produkt, StatusParagonu, KategoriaProduktu, StatusMapowania
+
+    paragon = Paragon(
+        id=1,
+        nazwa_pliku_oryginalnego="paragon.jpg",
+        sciezka_pliku_na_serwerze="uploads/paragon.jpg",
+        mime_type_pliku="image/jpeg",
+        status_przetwarzania=StatusParagonu.PRZETWORZONY_OK,
+        data_wyslania=datetime(2024, 5, 3, 12, 0)
+    )
+    produkty = [
+        Produkt(
+            id=10, nazwa="MLEKO UHT 3,2% 1L", kategoria=KategoriaProduktu.SPOZYWCZE, cena=Decimal("3.49"),
+            paragon_id=1, status_mapowania=StatusMapowania.OCZEKUJE,
+            sugestie_mapowania=json.dumps([
+                {"id": 2, "nazwa": "Mleko", "kategoria": "Spożywcze", "podobienstwo": 87}
+            ])
+        ),
+        Produkt(
+            id=11, nazwa="CHLEB RAZOWY", kategoria=KategoriaProduktu.PIECZYWO, cena=Decimal("5.99"),
+            paragon_id=1, status_mapowania=StatusMapowania.OCZEKUJE, sugestie_mapowania="[]"
+        )
+    ]
+
+    html = paragony.templates.get_template("paragony/mapowanie.html").render(
+        request=SimpleNamespace(url=SimpleNamespace(path="/paragony/1/mapowanie")),
+        paragon=paragon,
+        produkty=produkty,
+        sugestie=paragony._decode_suggestions(produkty)
+    )
+
+    assert "Paragon z dnia: 2024-05-03" in html
+    assert "MLEKO UHT 3,2% 1L" in html
+    assert "Mleko (Spożywcze)" in html
+    assert "87%" in html
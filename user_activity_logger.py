@@ -9,19 +9,6 @@ from db_logger import log_to_db
 import traceback
 import sys
 
-def log_to_db(poziom: PoziomLogu, modul: str, funkcja: str, komunikat: str, szczegoly: str = None):
-    """Helper function to log to database"""
-    with SessionLocal() as db:
-        log = LogBledow(
-            poziom=poziom,
-            modul_aplikacji=modul,
-            funkcja=funkcja,
-            komunikat_bledu=komunikat,
-            szczegoly_techniczne=szczegoly
-        )
-        db.add(log)
-        db.commit()
-
 class UserActivityLogger:
     def __init__(self):
         self.logger = logging.getLogger("user_activity")
@@ -0,0 +1,78 @@
+from typing import Any, Coroutine, Optional
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WorkerEventLoop:
+    """Long-lived asyncio event loop on a background thread of a Celery worker process
+
+    Tasks submit coroutines with run() instead of calling asyncio.run(), so loop-bound
+    resources such as the pooled Ollama client survive between tasks. With the threads
+    pool (celery -A tasks worker -P threads -c 4) several tasks share the loop and one
+    receipt keeps processing while another waits on the LLM.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the loop thread if it is not running yet"""
+        with self._lock:
+            if self.loop is not None and self.loop.is_running():
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run_loop, name="worker-event-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self.loop = loop
+            logger.info("Worker event loop started")
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the worker loop and wait for its result"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Timeouts and Celery time limits interrupt the waiting thread only
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop the loop and wait for its thread to finish"""
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop = None
+            self._thread = None
+        if loop is None:
+            return
+
+        async def cancel_pending():
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_pending(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"Error cancelling pending worker loop tasks: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+        logger.info("Worker event loop stopped")
+
+worker_loop = WorkerEventLoop()